@@ -0,0 +1,60 @@
+"""
+Library API of the translation stages, for programs that run many
+translations in the same process (see worker.py) instead of one script run
+per survey:
+
+    survey = load_survey('limesurvey_survey_256242.lss')
+    generate_table('limesurvey_survey_256242.lss',
+                   'spreadsheet_to_review_256242.csv')
+
+    translations = load_translations('spreadsheet_reviewed_256242.csv')
+    compile_translation_map('spreadsheet_reviewed_256242.csv',
+                            'translation_map_256242.json')
+    rewrite_lss('limesurvey_survey_256242.lss', translations)
+    translate_vv('vvexport_256242.csv', translations)
+
+The translated files are written as <name>_new.<extension>, as the scripts
+do. Surveys are read through the cache of lss_cache.py.
+"""
+
+import translate_codes
+from gen_translation_table import code_generator, \
+    generate_translation_table as generate_table
+from lss_cache import read_lss as load_survey
+from translate_codes import compile_translation_map, scan_residues, \
+    translate, translate_files, translate_lss as rewrite_lss, translate_vv
+from validation import ValidationError, validate_spreadsheet
+
+__all__ = [
+    'ValidationError', 'compile_translation_map', 'generate_table',
+    'load_survey', 'load_translations', 'rewrite_lss', 'scan_residues',
+    'translate', 'translate_files', 'translate_vv', 'validate_spreadsheet',
+    'warm_up'
+]
+
+
+def load_translations(spreadsheet_input_file='', translation_map_file='',
+                      validate=True):
+    """
+    :param spreadsheet_input_file: spreadsheet translated/reviewed
+    :param translation_map_file: translation map compiled from the
+    spreadsheet, used instead of it (the spreadsheet, if given, must be the
+    one it was compiled from)
+    :param validate: validate the spreadsheet first (a translation map was
+    validated when compiled)
+    :return: Survey with the original and translated codes
+    :raise ValidationError: the spreadsheet has errors
+    :raise StaleMapError: the map was compiled from another version of the
+    spreadsheet
+    """
+    if validate and spreadsheet_input_file and not translation_map_file:
+        validate_spreadsheet(spreadsheet_input_file)
+    return translate_codes.load_translations(spreadsheet_input_file,
+                                             translation_map_file)
+
+
+def warm_up():
+    """
+    load in advance what the first job would load (stopwords)
+    """
+    return code_generator.stopwords
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+
+"""
+Runs table generation (gen_translation_table.py) or code translation
+(translate_codes.py) for many surveys, in a pool of processes.
+
+Surveys are given by a directory or by a manifest:
+- directory: each limesurvey_survey_<sid>.lss file is a survey, with the
+  reviewed spreadsheet spreadsheet_reviewed_<sid>.csv and the vv file
+  vvexport_<sid>.csv (or any other vvexport_<sid>.* extension)
+- manifest: csv file with the columns lss, reviewed and vv. Relative paths
+  are relative to the manifest directory
+
+Generated spreadsheets are written next to each lss file, as
+spreadsheet_to_review_<sid>.csv.
+
+A failing survey does not abort the batch: the status and the time of each
+survey are reported at the end.
+"""
+
+import csv
+import getopt
+import glob
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import gen_translation_table
+import translate_codes
+
+GENERATE = 'generate'
+TRANSLATE = 'translate'
+
+# LimeSurvey survey ids are numeric: translated files (<name>_new.lss) are
+# not surveys
+LSS_FILE_NAME = re.compile(r'^limesurvey_survey_(?P<sid>\d+)\.lss$')
+
+USAGE = 'batch.py -m <generate|translate> (-d <directory> | ' \
+        '-f <manifest>) [-j <processes>]'
+
+
+class Job:
+    """
+    files of a survey
+    """
+    __slots__ = ('lss', 'reviewed', 'vv')
+
+    def __init__(self, lss, reviewed='', vv=''):
+        self.lss = lss
+        self.reviewed = reviewed
+        self.vv = vv
+
+    def survey_id(self):
+        match = LSS_FILE_NAME.match(os.path.basename(self.lss))
+        if match:
+            return match.group('sid')
+        return os.path.splitext(os.path.basename(self.lss))[0]
+
+    def table_file_name(self):
+        return os.path.join(
+            os.path.dirname(self.lss),
+            'spreadsheet_to_review_%s.csv' % self.survey_id()
+        )
+
+
+def jobs_from_directory(directory):
+    """
+    :param directory: directory with the lss, reviewed spreadsheets and vv
+    files
+    :return: list of Job
+    """
+    jobs = []
+    for lss in sorted(glob.glob(os.path.join(directory,
+                                             'limesurvey_survey_*.lss'))):
+        match = LSS_FILE_NAME.match(os.path.basename(lss))
+        if not match:
+            continue
+        sid = match.group('sid')
+        vv_files = [
+            file_name for file_name in sorted(glob.glob(
+                os.path.join(directory, 'vvexport_%s.*' % sid)
+            ))
+            if not os.path.splitext(file_name)[0].endswith('_new')
+        ]
+        jobs.append(Job(
+            lss,
+            os.path.join(directory, 'spreadsheet_reviewed_%s.csv' % sid),
+            vv_files[0] if vv_files else ''
+        ))
+    return jobs
+
+
+def jobs_from_manifest(manifest_file_name):
+    """
+    :param manifest_file_name: csv file with the columns lss, reviewed, vv
+    :return: list of Job
+    """
+    directory = os.path.dirname(os.path.abspath(manifest_file_name))
+    jobs = []
+    with open(manifest_file_name, 'r', newline='') as f:
+        for line in csv.DictReader(f):
+            jobs.append(Job(*[
+                os.path.join(directory, line[column])
+                if line.get(column) else ''
+                for column in ('lss', 'reviewed', 'vv')
+            ]))
+    return jobs
+
+
+def run_job(mode, job):
+    """
+    run a job, catching any error so the other jobs go on
+    :param mode: GENERATE or TRANSLATE
+    :param job: Job
+    :return: (error message or None, elapsed time in seconds)
+    """
+    start = time.perf_counter()
+    try:
+        if mode == GENERATE:
+            gen_translation_table.generate_translation_table(
+                job.lss, job.table_file_name()
+            )
+        else:
+            translate_codes.translate(job.lss, job.vv, job.reviewed)
+        error = None
+    except (Exception, SystemExit):
+        error = traceback.format_exc(limit=3)
+    return error, time.perf_counter() - start
+
+
+def run_batch(mode, jobs, processes=None):
+    """
+    run the jobs in a pool of processes
+    :param mode: GENERATE or TRANSLATE
+    :param jobs: list of Job
+    :param processes: number of processes (default: number of CPUs)
+    :return: list of (job, error message or None, elapsed time), in the
+    order of the jobs
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(run_job, mode, job): index
+            for index, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                error, elapsed = future.result()
+            except Exception:
+                # e.g. the worker process died
+                error, elapsed = traceback.format_exc(limit=3), 0.0
+            results[index] = (jobs[index], error, elapsed)
+            print('%-6s %-40s %8.2fs' % (
+                'OK' if error is None else 'FAILED',
+                jobs[index].survey_id(), elapsed
+            ))
+    return [results[index] for index in range(len(jobs))]
+
+
+def parse_options(argv):
+    mode = ''
+    directory = ''
+    manifest = ''
+    processes = None
+    try:
+        opts, args = getopt.getopt(
+            argv, 'hm:d:f:j:', ['mode=', 'directory=', 'manifest=', 'jobs=']
+        )
+    except getopt.GetoptError:
+        print(USAGE)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit(1)
+        elif opt in ('-m', '--mode'):
+            mode = arg
+        elif opt in ('-d', '--directory'):
+            directory = arg
+        elif opt in ('-f', '--manifest'):
+            manifest = arg
+        elif opt in ('-j', '--jobs'):
+            processes = int(arg)
+
+    if mode not in (GENERATE, TRANSLATE) or \
+            bool(directory) == bool(manifest):
+        print(USAGE)
+        sys.exit(2)
+
+    return [mode, directory, manifest, processes]
+
+
+def main(argv):
+    mode, directory, manifest, processes = parse_options(argv)
+    jobs = jobs_from_directory(directory) if directory \
+        else jobs_from_manifest(manifest)
+
+    start = time.perf_counter()
+    results = run_batch(mode, jobs, processes)
+
+    failed = [(job, error) for job, error, elapsed in results if error]
+    for job, error in failed:
+        print('\n%s (%s):\n%s' % (job.survey_id(), job.lss, error))
+    print('\n%d surveys, %d failed, %.2fs' % (
+        len(results), len(failed), time.perf_counter() - start
+    ))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
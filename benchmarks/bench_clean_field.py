@@ -0,0 +1,125 @@
+"""
+Micro-benchmark of code generation: the original clean_field() function
+against CodeGenerator.clean_field().
+
+The original function read the stop words from disk on every call
+(nltk.corpus.stopwords.words): the legacy version does the same, from the
+NLTK corpus when it is installed, or from the bundled copy.
+
+Usage: python benchmarks/bench_clean_field.py [repetitions]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_generator import CodeGenerator  # noqa: E402
+from stopword_provider import read_bundled_stopwords  # noqa: E402
+
+try:
+    from nltk.corpus import stopwords as nltk_stopwords
+    nltk_stopwords.words('english')
+except (ImportError, LookupError):
+    nltk_stopwords = None
+
+LABELS = [
+    'Other', 'Right', 'Left', 'Both sides', 'Not applicable',
+    'Which side was injured?', 'Date of the surgery',
+    'Did the patient have pain in the shoulder(s)?',
+    'Strength of the <b>elbow</b> flexion (MRC)',
+    'Is there any EMG exam of the brachial plexus?',
+    'Time between the injury and the surgery (in months)',
+]
+
+
+def legacy_strip_html(data):
+    p = re.compile(r'<.*?>')
+    return p.sub('', data)
+
+
+def legacy_stopwords():
+    """
+    stop words read from disk, as the original code did on every call
+    """
+    if nltk_stopwords is not None:
+        return nltk_stopwords.words('english')
+    return read_bundled_stopwords('english')
+
+
+def legacy_clean_field(content, size, prefix=''):
+    """
+    clean_field() as it was in gen_translation_table.py
+    """
+    clean_content = content
+
+    clean_content = clean_content.replace('(s)', '')
+    clean_content = clean_content.replace('(S)', '')
+
+    words_to_exclude = legacy_stopwords()
+    words_to_exclude.remove('other')
+    words_to_exclude.remove('not')
+
+    clean_content = ' '.join(
+        [word for word in clean_content.split(' ')
+         if word.lower() not in words_to_exclude]
+    )
+
+    capital_words = \
+        [word for word in re.sub(r"[^\w]", " ", clean_content).split()
+         if word.isupper() and len(word) > 2]
+    if capital_words:
+        clean_content = ' '.join(capital_words)
+
+    clean_content = ''.join(
+        x for x in clean_content.title() if not x.isspace()
+    )
+
+    clean_content = legacy_strip_html(clean_content)
+
+    clean_content = ''.join(e for e in clean_content if e.isalnum())
+
+    return (prefix + clean_content)[:size]
+
+
+def main(argv):
+    repetitions = int(argv[0]) if argv else 200
+    generator = CodeGenerator()
+    # same engine without memoization, to measure the cost of a first call
+    uncached_generator = CodeGenerator(cache_size=0)
+
+    for label in LABELS:
+        assert generator.clean_field(label, 20, 'lst') == \
+            legacy_clean_field(label, 20, 'lst'), label
+
+    def run_legacy():
+        for label in LABELS:
+            legacy_clean_field(label, 20, 'lst')
+
+    def run_generator():
+        for label in LABELS:
+            generator.clean_field(label, 20, 'lst')
+
+    def run_uncached_generator():
+        for label in LABELS:
+            uncached_generator.clean_field(label, 20, 'lst')
+
+    print('legacy stop words:        %s' % (
+        'NLTK corpus' if nltk_stopwords is not None else 'bundled file'
+    ))
+    legacy = timeit.timeit(run_legacy, number=repetitions)
+    uncached = timeit.timeit(run_uncached_generator, number=repetitions)
+    current = timeit.timeit(run_generator, number=repetitions)
+    calls = repetitions * len(LABELS)
+
+    print('legacy clean_field:       %5.2f us/call' % (legacy / calls * 1e6))
+    print('CodeGenerator (no cache): %5.2f us/call' % (uncached / calls * 1e6))
+    print('CodeGenerator:            %5.2f us/call' % (current / calls * 1e6))
+    print('speedup:                  %5.1fx' % (legacy / current))
+    print(generator.cache_info())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+"""
+Benchmark suite of both pipelines, on a synthetic survey (synthetic.py).
+
+Each stage is timed separately:
+- lss_parsing: read_lss()
+- code_generation: CodeGenerator.clean_field() of every question and
+  subquestion, with an empty cache
+- lss_cache_cold: SurveyCache.read_lss() with an empty cache (parsed and
+  stored)
+- lss_cache_warm: SurveyCache.read_lss() of the survey already cached
+- table_generation: gen_translation_table.generate_translation_table()
+- csv_export: writing the rows of the spreadsheet
+- spreadsheet_reading: translate_codes.read_spreadsheet()
+- lss_rewrite: translate_codes.translate_lss()
+- vv_header_rewrite: FieldIndex of the survey and translation of the header
+- answer_translation: translate_vv_file() (responses read, translated and
+  written)
+- residue_scan: translate_codes.scan_residues() of the translated files
+
+Results are written as json (stdout or --json <file>), with the parameters of
+the survey, the versions of python and pandas, the xml backend (lxml or
+etree, see xml_backend.py) and the best and median time of each stage, so
+runs of different versions can be compared. The cache of lss_cache.py is disabled (except in
+the lss_cache stages, where it is in the temporary directory), so every
+other stage parses the lss file as the previous versions did.
+
+Usage: python benchmarks/run_benchmarks.py [--json <file>] [--repeat N]
+       [--groups N] [--questions N] [--subquestions N] [--answers N]
+       [--languages N] [--relevance N] [--responses N] [--seed N]
+"""
+
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gen_translation_table  # noqa: E402
+import translate_codes  # noqa: E402
+from code_generator import CodeGenerator  # noqa: E402
+from lss_cache import SurveyCache  # noqa: E402
+from survey_model import read_lss  # noqa: E402
+from synthetic import PARAMETERS, SyntheticSurvey, \
+    parse_parameters  # noqa: E402
+from vv_translation import FieldIndex, translate_vv_file  # noqa: E402
+from xml_backend import backend  # noqa: E402
+
+
+def measure(function, repeat):
+    """
+    :param function: stage to be timed, without arguments
+    :param repeat: number of runs
+    :return: dict with the best and the median time, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times),
+            'runs': repeat}
+
+
+def run(parameters, directory, repeat):
+    """
+    :param parameters: parameters of the synthetic survey
+    :param directory: directory of the generated files
+    :param repeat: number of runs of each stage
+    :return: dict stage -> timings
+    """
+    survey = SyntheticSurvey(**{name: parameters[name]
+                                for name in PARAMETERS})
+    lss_file = os.path.join(directory, 'limesurvey_survey_%s.lss' % survey.sid)
+    vv_file = os.path.join(directory, 'vvexport_%s.csv' % survey.sid)
+    spreadsheet_file = os.path.join(
+        directory, 'spreadsheet_reviewed_%s.csv' % survey.sid
+    )
+    survey.write_lss(lss_file)
+    survey.write_vv(vv_file, parameters['responses'])
+
+    results = {}
+    results['lss_parsing'] = measure(lambda: read_lss(lss_file), repeat)
+
+    parsed = read_lss(lss_file)
+    descriptions = [
+        question.description('en') or ''
+        for question in parsed.questions.values()
+    ]
+    descriptions += [
+        subquestion.description('en') or ''
+        for question in parsed.questions.values()
+        for subquestion in question.subquestions.values()
+    ]
+
+    def generate_codes():
+        code_generator = CodeGenerator()
+        for description in descriptions:
+            code_generator.clean_field(description, 20, 'lst')
+
+    # stopwords are loaded once, outside of the timing
+    CodeGenerator().stopwords
+    results['code_generation'] = measure(generate_codes, repeat)
+
+    cache_directory = os.path.join(directory, 'cache')
+
+    def read_lss_cold():
+        shutil.rmtree(cache_directory, ignore_errors=True)
+        SurveyCache(cache_directory).read_lss(lss_file)
+
+    results['lss_cache_cold'] = measure(read_lss_cold, repeat)
+    results['lss_cache_warm'] = measure(
+        lambda: SurveyCache(cache_directory).read_lss(lss_file), repeat
+    )
+
+    results['table_generation'] = measure(
+        lambda: gen_translation_table.generate_translation_table(
+            lss_file, spreadsheet_file
+        ), repeat
+    )
+
+    with open(spreadsheet_file, 'r', newline='', encoding='UTF-8') as f:
+        rows = list(csv.reader(f))
+
+    def export_csv():
+        with io.StringIO(newline='') as csv_file:
+            writer = csv.writer(csv_file, quotechar='"',
+                                quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerows(rows)
+
+    results['csv_export'] = measure(export_csv, repeat)
+
+    results['spreadsheet_reading'] = measure(
+        lambda: translate_codes.read_spreadsheet(spreadsheet_file), repeat
+    )
+    translations = translate_codes.read_spreadsheet(spreadsheet_file)
+
+    results['lss_rewrite'] = measure(
+        lambda: translate_codes.translate_lss(lss_file, translations), repeat
+    )
+
+    with open(vv_file, 'r') as f:
+        f.readline()
+        header = f.readline()
+
+    results['vv_header_rewrite'] = measure(
+        lambda: FieldIndex(translations.question_codes).translate_header(
+            header
+        ), repeat
+    )
+
+    def translate_answers():
+        with open(os.devnull, 'w') as output:
+            translate_vv_file(vv_file, output,
+                              FieldIndex(translations.question_codes))
+
+    results['answer_translation'] = measure(translate_answers, repeat)
+
+    translate_codes.translate_vv(vv_file, translations)
+    results['residue_scan'] = measure(
+        lambda: translate_codes.scan_residues(lss_file, vv_file,
+                                              translations), repeat
+    )
+    return results
+
+
+def main(argv):
+    parameters = {'groups': 20, 'questions': 25, 'subquestions': 6,
+                  'answers': 5, 'languages': 2, 'relevance': 2,
+                  'responses': 5000, 'seed': 42,
+                  'json': '', 'repeat': 3}
+    parse_parameters(argv, parameters)
+    # surveys are parsed in every stage, and nothing is left in the user's
+    # cache
+    os.environ['LSS_CACHE_DIR'] = ''
+
+    directory = tempfile.mkdtemp(prefix='limesurvey-benchmark-')
+    try:
+        # translations print their progress; only the json goes to stdout
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            stages = run(parameters, directory, parameters['repeat'])
+        finally:
+            sys.stdout = stdout
+    finally:
+        shutil.rmtree(directory)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pandas.__version__,
+        'xml_backend': backend.name,
+        'parameters': {name: parameters[name]
+                       for name in PARAMETERS + ('responses',)},
+        'stages': stages
+    }
+    content = json.dumps(report, indent=2, sort_keys=True)
+    if parameters['json']:
+        with open(parameters['json'], 'w') as f:
+            f.write(content + '\n')
+    else:
+        print(content)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
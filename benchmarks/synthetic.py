@@ -0,0 +1,395 @@
+"""
+Deterministic generator of synthetic LimeSurvey surveys (.lss) and matching
+vv response files, used to benchmark the translation pipelines.
+
+The same parameters and seed always give the same files.
+
+Usage: python benchmarks/synthetic.py -o <directory> [--groups N] ...
+"""
+
+import getopt
+import os
+import random
+import sys
+from xml.sax.saxutils import escape
+
+WORDS_PT = ['dor', 'lado', 'braco', 'perna', 'mao', 'ombro', 'cotovelo',
+            'punho', 'dedo', 'nervo', 'lesao', 'forca', 'sensibilidade',
+            'cirurgia', 'tempo', 'data', 'outro', 'exame', 'teste', 'reflexo']
+WORDS_EN = ['pain', 'side', 'arm', 'leg', 'hand', 'shoulder', 'elbow',
+            'wrist', 'finger', 'nerve', 'injury', 'strength', 'sensitivity',
+            'surgery', 'time', 'date', 'other', 'exam', 'test', 'reflex',
+            'the', 'of', 'which', 'is', 'was', 'not', 'did', 'you', 'have',
+            'Other', 'Right', 'Left', 'MRC', 'EMG']
+ANSWER_CODES = ['S', 'N', 'D', 'E', 'DE', 'NINA', 'A1', 'A2', 'A3', 'A4']
+
+# question type -> (has subquestions, has answers)
+QUESTION_TYPES = [
+    ('L', False, True),
+    ('M', True, False),
+    ('F', True, True),
+    ('H', True, True),
+    ('1', True, True),
+    ('P', True, False),
+    (';', True, False),
+    ('N', False, False),
+    ('T', False, False),
+    ('D', False, False),
+    ('*', False, False),
+    ('X', False, False),
+]
+
+QUESTION_FIELDS = ['qid', 'parent_qid', 'sid', 'gid', 'type', 'title',
+                   'question', 'preg', 'help', 'other', 'mandatory',
+                   'question_order', 'language', 'scale_id', 'same_default',
+                   'relevance']
+
+
+def _cdata(value):
+    return '<![CDATA[%s]]>' % value
+
+
+def _row(fields, indent='   '):
+    lines = [indent + '<row>']
+    for name, value in fields:
+        lines.append('%s <%s>%s</%s>' % (indent, name, _cdata(value), name))
+    lines.append(indent + '</row>')
+    return '\n'.join(lines)
+
+
+def _section(name, field_names, rows):
+    lines = [' <%s>' % name, '  <fields>']
+    for field in field_names:
+        lines.append('   <fieldname>%s</fieldname>' % field)
+    lines.append('  </fields>')
+    lines.append('  <rows>')
+    lines.extend(rows)
+    lines.append('  </rows>')
+    lines.append(' </%s>' % name)
+    return '\n'.join(lines)
+
+
+def _sentence(rng, words, size):
+    return ' '.join(rng.choice(words) for _ in range(size))
+
+
+class SyntheticSurvey:
+    """
+    In-memory description of a generated survey, shared by the lss and vv
+    writers so that both files refer to the same codes.
+    """
+
+    def __init__(self, groups=5, questions=10, subquestions=4, answers=4,
+                 languages=2, relevance=1, seed=42, sid='772619'):
+        self.rng = random.Random(seed)
+        self.sid = sid
+        self.languages = ['pt-BR', 'en', 'es', 'fr', 'de'][:max(2, languages)]
+        self.relevance_clauses = relevance
+        self.groups = []
+        self.questions = []
+
+        rng = self.rng
+        qid = 10000
+        gid = 100
+        for group_order in range(groups):
+            gid += 1
+            group = {'gid': str(gid), 'order': str(group_order),
+                     'name': _sentence(rng, WORDS_PT, 3)}
+            self.groups.append(group)
+            for question_order in range(questions):
+                qid += 1
+                qtype, has_sub, has_answers = \
+                    QUESTION_TYPES[(qid + gid) % len(QUESTION_TYPES)]
+                if qtype == '*':
+                    code = 'form%d' % qid
+                elif qtype == 'X':
+                    code = 'tex%d' % qid
+                else:
+                    code = '%s%s%d' % (rng.choice(WORDS_PT),
+                                       rng.choice(WORDS_PT), qid)
+                question = {
+                    'qid': str(qid), 'gid': str(gid), 'type': qtype,
+                    'code': code, 'order': str(question_order),
+                    'other': 'Y' if qtype in ('M', 'L') and
+                    rng.random() < 0.3 else 'N',
+                    'text': {
+                        language: _sentence(
+                            rng, WORDS_EN if language == 'en' else WORDS_PT,
+                            rng.randint(3, 8))
+                        for language in self.languages},
+                    'subquestions': [], 'answers': [], 'relevance': '1'}
+                if has_sub:
+                    count = subquestions * 2 if qtype == ';' else subquestions
+                    for index in range(count):
+                        qid += 1
+                        question['subquestions'].append({
+                            'qid': str(qid),
+                            'code': 'SQ%03d' % (index + 1),
+                            'order': str(index),
+                            'scale': '1' if qtype == ';' and
+                            index >= subquestions else '0',
+                            'text': {
+                                language: _sentence(
+                                    rng, WORDS_EN if language == 'en'
+                                    else WORDS_PT, rng.randint(1, 4))
+                                for language in self.languages}})
+                if has_answers:
+                    scales = ['0', '1'] if qtype == '1' else ['0']
+                    for scale in scales:
+                        for index in range(answers):
+                            question['answers'].append({
+                                'code': ANSWER_CODES[index % len(
+                                    ANSWER_CODES)],
+                                'order': str(index + 1),
+                                'scale': scale,
+                                'text': {
+                                    language: _sentence(
+                                        rng, WORDS_EN if language == 'en'
+                                        else WORDS_PT, 2)
+                                    for language in self.languages}})
+                self.questions.append(question)
+
+        self._add_relevance_and_formulas()
+
+    def sgqa(self, question, subquestion=None):
+        name = '%sX%sX%s' % (self.sid, question['gid'], question['qid'])
+        if subquestion is not None:
+            name += subquestion['code']
+        return name
+
+    def _add_relevance_and_formulas(self):
+        rng = self.rng
+        self.conditions = []
+        cid = 0
+        for index, question in enumerate(self.questions):
+            previous = [q for q in self.questions[:index]
+                        if q['answers'] and q['type'] != '1']
+            if question['type'] == '*' and index > 0:
+                source = self.questions[rng.randrange(index)]
+                question['text'] = {
+                    language: '{if(%s.NAOK == 1, 1, 0)}' % source['code']
+                    for language in self.languages}
+            elif question['type'] == 'X' and index > 0:
+                source = self.questions[rng.randrange(index)]
+                question['text'] = {
+                    language: '<p>Veja {%s.shown}</p>' % source['code']
+                    for language in self.languages}
+            if not previous or not self.relevance_clauses:
+                continue
+            clauses = []
+            for _ in range(self.relevance_clauses):
+                source = rng.choice(previous)
+                subquestion = rng.choice(source['subquestions']) \
+                    if source['subquestions'] else None
+                answer = rng.choice(source['answers'])
+                clauses.append('%s.NAOK == "%s"' % (
+                    self.sgqa(source, subquestion), answer['code']))
+                cid += 1
+                self.conditions.append({
+                    'cid': str(cid), 'qid': question['qid'],
+                    'cqid': source['qid'], 'method': '==',
+                    'cfieldname': self.sgqa(source, subquestion),
+                    'value': answer['code']})
+            question['relevance'] = '((%s))' % ' or '.join(clauses)
+
+    def write_lss(self, path):
+        answer_rows = []
+        for question in self.questions:
+            for answer in question['answers']:
+                for language in self.languages:
+                    answer_rows.append(_row([
+                        ('qid', question['qid']), ('code', answer['code']),
+                        ('answer', escape(answer['text'][language])),
+                        ('sortorder', answer['order']),
+                        ('assessment_value', '0'), ('language', language),
+                        ('scale_id', answer['scale'])]))
+        condition_rows = [
+            _row([(name, condition[name]) for name in
+                  ('cid', 'qid', 'cqid', 'cfieldname', 'method', 'value')] +
+                 [('scenario', '1')])
+            for condition in self.conditions]
+        group_rows = []
+        for group in self.groups:
+            for language in self.languages:
+                group_rows.append(_row([
+                    ('gid', group['gid']), ('sid', self.sid),
+                    ('group_name', group['name']),
+                    ('group_order', group['order']),
+                    ('description', ''), ('language', language),
+                    ('randomization_group', ''),
+                    ('grelevance', '')]))
+        question_rows = []
+        subquestion_rows = []
+        for question in self.questions:
+            for language in self.languages:
+                question_rows.append(_row([
+                    ('qid', question['qid']), ('parent_qid', '0'),
+                    ('sid', self.sid), ('gid', question['gid']),
+                    ('type', question['type']), ('title', question['code']),
+                    ('question', question['text'][language]),
+                    ('preg', ''), ('help', ''), ('other', question['other']),
+                    ('mandatory', 'N'),
+                    ('question_order', question['order']),
+                    ('language', language), ('scale_id', '0'),
+                    ('same_default', '0'),
+                    ('relevance', question['relevance'])]))
+                for subquestion in question['subquestions']:
+                    subquestion_rows.append(_row([
+                        ('qid', subquestion['qid']),
+                        ('parent_qid', question['qid']),
+                        ('sid', self.sid), ('gid', question['gid']),
+                        ('type', 'T'), ('title', subquestion['code']),
+                        ('question', escape(subquestion['text'][language])),
+                        ('preg', ''), ('help', ''), ('other', 'N'),
+                        ('mandatory', ''),
+                        ('question_order', subquestion['order']),
+                        ('language', language),
+                        ('scale_id', subquestion['scale']),
+                        ('same_default', '0'), ('relevance', '1')]))
+
+        with open(path, 'w', encoding='UTF-8') as lss_file:
+            lss_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            lss_file.write('<document>\n')
+            lss_file.write(' <LimeSurveyDocType>Survey</LimeSurveyDocType>\n')
+            lss_file.write(' <DBVersion>184</DBVersion>\n')
+            lss_file.write(' <languages>\n')
+            for language in self.languages:
+                lss_file.write('  <language>%s</language>\n' % language)
+            lss_file.write(' </languages>\n')
+            lss_file.write(_section(
+                'answers', ['qid', 'code', 'answer', 'sortorder',
+                            'assessment_value', 'language', 'scale_id'],
+                answer_rows) + '\n')
+            lss_file.write(_section(
+                'conditions', ['cid', 'qid', 'cqid', 'cfieldname', 'method',
+                               'value', 'scenario'],
+                condition_rows) + '\n')
+            lss_file.write(_section(
+                'groups', ['gid', 'sid', 'group_name', 'group_order',
+                           'description', 'language', 'randomization_group',
+                           'grelevance'], group_rows) + '\n')
+            lss_file.write(_section('questions', QUESTION_FIELDS,
+                                    question_rows) + '\n')
+            lss_file.write(_section('subquestions', QUESTION_FIELDS,
+                                    subquestion_rows) + '\n')
+            lss_file.write('</document>\n')
+
+    def field_names(self):
+        """
+        vv field names with, for each one, the answer codes it may hold
+        """
+        fields = []
+        for question in self.questions:
+            code = question['code']
+            answer_codes = [a['code'] for a in question['answers']]
+            subquestions = question['subquestions']
+            qtype = question['type']
+            if qtype == 'X':
+                continue
+            if qtype == ';':
+                rows = [s for s in subquestions if s['scale'] == '0']
+                columns = [s for s in subquestions if s['scale'] == '1']
+                for row in rows:
+                    for column in columns:
+                        fields.append(('%s_%s_%s' % (code, row['code'],
+                                                     column['code']), None))
+            elif qtype == '1':
+                for subquestion in subquestions:
+                    for scale in ('0', '1'):
+                        fields.append(('%s_%s#%s' % (
+                            code, subquestion['code'], scale), [
+                            a['code'] for a in question['answers']
+                            if a['scale'] == scale]))
+            elif subquestions:
+                for subquestion in subquestions:
+                    fields.append(('%s_%s' % (code, subquestion['code']),
+                                   answer_codes or ['Y', '']))
+                    if qtype == 'P':
+                        fields.append(('%s_%scomment' % (
+                            code, subquestion['code']), None))
+            else:
+                fields.append((code, answer_codes or None))
+            if question['other'] == 'Y':
+                fields.append(('%s_other' % code, None))
+        return fields
+
+    def write_vv(self, path, responses=100):
+        rng = self.rng
+        fields = [('id', None), ('submitdate', None), ('lastpage', None),
+                  ('startlanguage', None)] + self.field_names()
+        with open(path, 'w', encoding='UTF-8') as vv_file:
+            vv_file.write('\t'.join('Resposta %s' % name
+                                    for name, _ in fields) + '\n')
+            vv_file.write('\t'.join(name for name, _ in fields) + '\n')
+            for response in range(responses):
+                cells = []
+                for name, codes in fields:
+                    if name == 'id':
+                        cells.append(str(response + 1))
+                    elif name == 'submitdate':
+                        cells.append('2018-06-01 10:00:00')
+                    elif name == 'lastpage':
+                        cells.append('3')
+                    elif name == 'startlanguage':
+                        cells.append('pt-BR')
+                    elif codes:
+                        cells.append(rng.choice(codes + ['']))
+                    else:
+                        cells.append(rng.choice(['', 'texto livre', '12']))
+                vv_file.write('\t'.join(cells) + '\n')
+
+
+USAGE = 'synthetic.py [-o <directory>] [--groups N] [--questions N] ' \
+        '[--subquestions N] [--answers N] [--languages N] [--relevance N] ' \
+        '[--responses N] [--seed N]'
+
+PARAMETERS = ('groups', 'questions', 'subquestions', 'answers', 'languages',
+              'relevance', 'seed')
+
+
+def parse_parameters(argv, parameters):
+    """
+    :param argv: command line options
+    :param parameters: dict option name -> default value, updated with the
+    values of the command line (converted to int when the default is int)
+    :return: arguments left
+    """
+    try:
+        opts, args = getopt.getopt(argv, 'ho:',
+                                   ['output='] +
+                                   [name + '=' for name in parameters
+                                    if name != 'output'])
+    except getopt.GetoptError:
+        print(USAGE)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit(1)
+        elif opt in ('-o', '--output'):
+            parameters['output'] = arg
+        else:
+            name = opt[2:]
+            parameters[name] = \
+                int(arg) if isinstance(parameters[name], int) else arg
+    return args
+
+
+def main(argv):
+    parameters = {'groups': 5, 'questions': 10, 'subquestions': 4,
+                  'answers': 4, 'languages': 2, 'relevance': 1,
+                  'responses': 100, 'seed': 42, 'output': '.'}
+    parse_parameters(argv, parameters)
+
+    survey = SyntheticSurvey(**{name: parameters[name]
+                                for name in PARAMETERS})
+    os.makedirs(parameters['output'], exist_ok=True)
+    survey.write_lss(os.path.join(
+        parameters['output'], 'limesurvey_survey_%s.lss' % survey.sid))
+    survey.write_vv(os.path.join(
+        parameters['output'], 'vvexport_%s.csv' % survey.sid),
+        parameters['responses'])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
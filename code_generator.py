@@ -0,0 +1,138 @@
+"""
+Generation of question and subquestion codes from their english description
+"""
+
+import re
+from functools import lru_cache
+
+from stopword_provider import load_stopwords
+
+# html tags
+HTML_TAG = re.compile(r'<.*?>')
+# anything that is not part of a word
+NON_WORD = re.compile(r'[^\w]')
+
+# stop words that carry meaning in question codes
+KEPT_STOPWORDS = ('other', 'not')
+
+
+def strip_html(data):
+    """
+    remove html tag from data
+    :param data: input string
+    :return: input string whithout html tags
+    """
+    return HTML_TAG.sub('', data)
+
+
+class CodeGenerator:
+    """
+    Builds codes from descriptions, e.g. 'Which side was injured?' ->
+    'SideInjured'. The stop words set and the regular expressions are built
+    once, and the generated codes are memoized, as the same labels ('Other',
+    'Right', 'Left'...) are repeated many times in a survey.
+    """
+
+    def __init__(self, stopwords=None, cache_size=4096):
+        """
+        :param stopwords: words to be removed from the descriptions. Defaults
+        to the english stop words, loaded when the first code is generated
+        :param cache_size: maximum number of codes memoized
+        """
+        self._stopwords = None
+        if stopwords is not None:
+            self._stopwords = frozenset(stopwords).difference(KEPT_STOPWORDS)
+        self._generate = lru_cache(maxsize=cache_size)(self._clean_field)
+
+    @property
+    def stopwords(self):
+        if self._stopwords is None:
+            self._stopwords = \
+                frozenset(load_stopwords('english')).difference(KEPT_STOPWORDS)
+        return self._stopwords
+
+    def clean_field(self, content, size, prefix=''):
+        """
+        code for a description
+        :param content: description (usually in english)
+        :param size: maximum size of the code
+        :param prefix: prefix of the code, e.g. the question type
+        :return: code
+        """
+        return self._generate(content, size, prefix)
+
+    def cache_info(self):
+        return self._generate.cache_info()
+
+    def _clean_field(self, content, size, prefix):
+        # remove (s)
+        clean_content = content.replace('(s)', '').replace('(S)', '')
+
+        # remove stop words
+        stopwords = self.stopwords
+        clean_content = ' '.join(
+            [word for word in clean_content.split(' ')
+             if word.lower() not in stopwords]
+        )
+
+        # if there is a word in capital letter, ignore other words
+        # TODO: select capital words only if it is word
+        capital_words = \
+            [word for word in NON_WORD.sub(' ', clean_content).split()
+             if word.isupper() and len(word) > 2]
+        if capital_words:
+            clean_content = ' '.join(capital_words)
+
+        # camel case
+        clean_content = ''.join(clean_content.title().split())
+
+        # remove html tags
+        clean_content = strip_html(clean_content)
+
+        # remove special chars
+        clean_content = ''.join(e for e in clean_content if e.isalnum())
+
+        return (prefix + clean_content)[:size]
+
+
+class CodeAllocator:
+    """
+    Issues unique codes. When a code was already issued, its last characters
+    are replaced by a counter (Side, Sid2, Sid3... Si10), so the size limit
+    is kept. The next counter of each base code is remembered and every
+    issued code is checked, so a new code is found in amortized O(1) and
+    never collides with a code issued before.
+    """
+
+    def __init__(self):
+        # codes already issued
+        self.issued = set()
+        # base code -> next counter to try
+        self.next_suffix = {}
+
+    def reserve(self, code):
+        """
+        mark a code as issued, e.g. a code reviewed previously
+        """
+        self.issued.add(code)
+
+    def allocate(self, code):
+        """
+        :param code: base code
+        :return: the base code, or a variation of it, not issued before
+        """
+        issued = self.issued
+        if code not in issued:
+            issued.add(code)
+            return code
+
+        count = self.next_suffix.get(code, 2)
+        while True:
+            suffix = str(count)
+            count += 1
+            candidate = code[:-len(suffix)] + suffix
+            if candidate not in issued:
+                break
+        self.next_suffix[code] = count
+        issued.add(candidate)
+        return candidate
@@ -0,0 +1,98 @@
+"""
+Multi-pattern matching of LimeSurvey codes inside free texts (formulas,
+boilerplate questions, relevance equations...).
+
+All the codes are compiled into a single regular expression factored as a
+trie, e.g. ['q1', 'q10', 'q2'] -> 'q(?:1(?:0)?|2)', so a text is scanned
+once, in linear time, whatever the number of codes. Matches are whole codes
+only ('q1' does not match inside 'q10' or 'aq1') and the longest code wins.
+"""
+
+import re
+
+# a code can't be preceded by a letter, digit or '_' ...
+CODE_START = r'(?<![0-9A-Za-z_])'
+# ... nor followed by a letter or digit. '_' is allowed after a code, as in
+# the '<question>_<subquestion>' field names
+CODE_END = r'(?![0-9A-Za-z])'
+
+
+def trie_pattern(words):
+    """
+    regular expression that matches any of the words, factored as a trie
+    :param words: iterable of non empty strings
+    :return: regular expression (string), or None if there are no words
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        # end of a word
+        node[''] = True
+
+    if not trie:
+        return None
+
+    def pattern(node):
+        alternatives = [
+            re.escape(char) + pattern(child)
+            for char, child in sorted(
+                (char, child) for char, child in node.items() if char
+            )
+        ]
+        if not alternatives:
+            return ''
+        if len(alternatives) == 1:
+            result = alternatives[0]
+            if '' in node:
+                return '(?:' + result + ')?'
+            return result
+        result = '(?:' + '|'.join(alternatives) + ')'
+        if '' in node:
+            result += '?'
+        return result
+
+    return pattern(trie)
+
+
+class CodeMatcher:
+    """
+    Finds and replaces codes of a translation map in texts
+    """
+
+    def __init__(self, translations):
+        """
+        :param translations: dict original code -> translated code
+        """
+        self.translations = {
+            code: translation for code, translation in translations.items()
+            if code
+        }
+        pattern = trie_pattern(self.translations)
+        self.regex = None if pattern is None else \
+            re.compile(CODE_START + pattern + CODE_END)
+
+    def finditer(self, text):
+        """
+        :param text: text to be scanned
+        :return: iterator of the match objects of the codes found
+        """
+        if self.regex is None or not text:
+            return iter(())
+        return self.regex.finditer(text)
+
+    def subn(self, text):
+        """
+        :param text: text to be translated
+        :return: translated text and number of codes replaced
+        """
+        if self.regex is None or not text:
+            return text, 0
+        translations = self.translations
+        return self.regex.subn(
+            lambda match: translations[match.group()], text
+        )
+
+    def sub(self, text):
+        return self.subn(text)[0]
@@ -0,0 +1,158 @@
+"""
+Lexer for LimeSurvey Expression Manager (EM) expressions and rewriter of the
+codes they reference.
+
+Relevance equations refer to questions by SGQA name:
+
+    <sid>X<gid>X<qid>[<subquestion code>][#<scale>][.<attribute>]
+
+e.g. ((256242X320X16517Outro.NAOK == "Y")). The rewriter translates the
+subquestion code of each SGQA reference and the answer codes compared with
+it, in a single pass over the token stream.
+"""
+
+import re
+from functools import lru_cache
+
+# kinds of tokens
+STRING = 'string'
+SGQA = 'sgqa'
+NAME = 'name'
+NUMBER = 'number'
+OPERATOR = 'operator'
+SPACE = 'space'
+OTHER = 'other'
+
+TOKEN = re.compile(r'''
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<sgqa>(?P<sid>\d+)X(?P<gid>\d+)X(?P<qid_code>\d+[0-9A-Za-z]*)
+        (?P<scale>\#\d+)?(?P<attribute>\.[A-Za-z_]+)?)
+  | (?P<name>[A-Za-z_][0-9A-Za-z_]*(?:\.[A-Za-z_]+)?)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<operator>==|!=|<=|>=|&&|\|\||[-+*/<>!=(),{}\[\]])
+  | (?P<space>\s+)
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+COMPARISON_OPERATORS = frozenset([
+    '==', '!=', '<', '>', '<=', '>=', 'eq', 'ne', 'lt', 'le', 'gt', 'ge'
+])
+
+# attributes of a reference whose value is the answer code
+VALUE_ATTRIBUTES = frozenset([None, '.NAOK', '.value', '.code'])
+
+DIGITS = re.compile(r'\d+')
+
+
+def tokenize(expression):
+    """
+    split an EM expression in tokens
+    :param expression: EM expression, e.g. a relevance equation
+    :return: iterator of (kind, match object)
+    """
+    for match in TOKEN.finditer(expression):
+        # the group of each kind encloses its inner groups, so it is always
+        # the last one closed
+        yield match.lastgroup, match
+
+
+class RelevanceRewriter:
+    """
+    Translates subquestion and answer codes in EM expressions. The rewrite
+    of each distinct expression is memoized, as relevance equations repeat
+    in the rows of every language.
+    """
+
+    def __init__(self, survey, cache_size=4096):
+        """
+        :param survey: Survey with the original and translated codes
+        :param cache_size: maximum number of expressions memoized
+        """
+        self.survey = survey
+        self.rewrite = lru_cache(maxsize=cache_size)(self._rewrite)
+
+    def resolve(self, qid_code):
+        """
+        find the question and subquestion referenced by the qid and
+        subquestion code of a SGQA name, e.g. '16517Outro'. As subquestion
+        codes may begin with digits, every split point is tried, longest
+        qid first.
+        :param qid_code: qid followed by the subquestion code, if any
+        :return: (question, subquestion) - both None if not found
+        """
+        questions = self.survey.questions
+        digits = DIGITS.match(qid_code).group()
+        found = (None, None)
+        for size in range(len(digits), 0, -1):
+            question = questions.get(qid_code[:size])
+            if question is None:
+                continue
+            subquestion_code = qid_code[size:]
+            if not subquestion_code:
+                return question, None
+            subquestion = question.subquestion_codes.get(subquestion_code)
+            if subquestion is not None:
+                return question, subquestion
+            if found[0] is None:
+                found = (question, None)
+        return found
+
+    def translate_reference(self, match):
+        """
+        :param match: match object of a SGQA token
+        :return: translated SGQA name, and the question it refers to
+        """
+        question, subquestion = self.resolve(match.group('qid_code'))
+        if subquestion is None or not subquestion.translated_code:
+            return match.group(), question
+        start, end = match.span('qid_code')
+        offset = match.start()
+        text = match.group()
+        return (text[:start - offset] + question.qid +
+                subquestion.translated_code + text[end - offset:]), question
+
+    def _rewrite(self, expression):
+        if not expression or 'X' not in expression:
+            return expression
+
+        texts = []
+        # position in texts -> question of the sgqa references
+        references = {}
+        # positions in texts of the comparison operators
+        comparisons = []
+        # positions in texts that are not whitespace
+        significant = []
+
+        for kind, match in tokenize(expression):
+            position = len(texts)
+            if kind == SGQA:
+                text, question = self.translate_reference(match)
+                texts.append(text)
+                if question is not None and \
+                        match.group('attribute') in VALUE_ATTRIBUTES:
+                    references[position] = question
+            else:
+                texts.append(match.group())
+                if match.group() in COMPARISON_OPERATORS:
+                    comparisons.append(len(significant))
+            if kind != SPACE:
+                significant.append((kind, position))
+
+        # translate answer codes compared with a reference, in either side
+        for index in comparisons:
+            if index == 0 or index + 1 == len(significant):
+                continue
+            left_kind, left = significant[index - 1]
+            right_kind, right = significant[index + 1]
+            if left in references and right_kind == STRING:
+                question, literal = references[left], right
+            elif right in references and left_kind == STRING:
+                question, literal = references[right], left
+            else:
+                continue
+            quote = texts[literal][0]
+            answer = question.answers.get(texts[literal][1:-1])
+            if answer is not None and answer.translated_code:
+                texts[literal] = quote + answer.translated_code + quote
+
+        return ''.join(texts)
@@ -0,0 +1,51 @@
+"""
+File helpers that allow many translations to run at the same time in the
+same directory
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+# permissions of the files created, as open() would do
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def new_file_name(file_name, suffix='_new'):
+    """
+    name of the translated version of a file, e.g. survey.lss ->
+    survey_new.lss
+    :param file_name: original file name
+    :param suffix: added to the name, before the extension
+    :return: new file name
+    """
+    root, extension = os.path.splitext(file_name)
+    return root + suffix + extension
+
+
+@contextmanager
+def atomic_write(file_name, mode='w', **kwargs):
+    """
+    open a file to be written atomically: the content goes to a temporary
+    file with a unique name in the same directory, which replaces file_name
+    only when everything was written. Readers never see a partial file and
+    concurrent writers never mix their contents.
+    :param file_name: file to be written
+    :param mode: 'w' or 'wb'
+    :param kwargs: other arguments of open()
+    """
+    directory = os.path.dirname(os.path.abspath(file_name))
+    handle, temp_file_name = tempfile.mkstemp(
+        dir=directory, prefix='.' + os.path.basename(file_name) + '.',
+        suffix='.tmp'
+    )
+    try:
+        with open(handle, mode, **kwargs) as f:
+            yield f
+        os.chmod(temp_file_name, 0o666 & ~_UMASK)
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
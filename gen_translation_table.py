@@ -5,66 +5,24 @@
 # LimeSurvey (limesurvey_survey_256242.lss)
 #
 # Saída: planilha com códigos para tradução
+#
+# Uso: gen_translation_table.py -l <arquivo lss> -o <planilha csv>
+#      [-p <planilha revisada anterior>] [--stats <arquivo json>]
+#      [--profile <arquivo cProfile>]
 
 import csv
-import nltk
-import re
-import xml.etree.ElementTree as ET
-
-from nltk.corpus import stopwords
-
-
-def strip_html(data):
-    """
-    remove html tag from data
-    :param data: input string
-    :return: input string whithout html tags
-    """
-    p = re.compile(r'<.*?>')
-    return p.sub('', data)
-
-
-def clean_field(content, size, prefix=''):
-    clean_content = content
+import getopt
+import hashlib
+import sys
 
-    # remove (s)
-    clean_content = clean_content.replace('(s)', '')
-    clean_content = clean_content.replace('(S)', '')
+from code_generator import CodeAllocator, CodeGenerator
+from file_utils import atomic_write
+from instrumentation import run, stats
+from lss_cache import read_lss
 
-    words_to_exclude = stopwords.words('english')
-    words_to_exclude.remove('other')
-    words_to_exclude.remove('not')
 
-    # remove stop words
-    clean_content = ' '.join(
-        [word for word in clean_content.split(' ')
-         if word.lower() not in words_to_exclude]
-    )
-
-    # if there is a word in capital letter, ignore other words
-    # TODO: select capital words only if it is word
-    capital_words = \
-        [word for word in re.sub("[^\w]", " ",  clean_content).split()
-         if word.isupper() and len(word) > 2]
-    if capital_words:
-        clean_content = ' '.join(capital_words)
-
-    # camel case
-    clean_content = ''.join(
-        x for x in clean_content.title() if not x.isspace()
-    )
-
-    # remove html tags
-    clean_content = strip_html(clean_content)
-
-    # remove special chars
-    clean_content = ''.join(e for e in clean_content if e.isalnum())
-
-    return (prefix + clean_content)[:size]
-
-
-# load stopwords
-nltk.download('stopwords')
+# stopwords are loaded when the first code is generated
+code_generator = CodeGenerator()
 
 question_types = {
     ';': ['Array (Flexible Labels) multiple texts', 'txt'],
@@ -96,153 +54,179 @@ answer_code_translation_list = {
 # questions that should not be translated
 special_question_codes = ['responsibleid', 'acquisitiondate', 'subjectid']
 
-# input file: lss file (xml file)
-# output file: csv file
-
-# input_lss_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/input' \
-#     '/limesurvey_survey_256242.lss'
-# output_csv_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/output' \
-#     '/spreadsheet_to_review_256242.csv'
-
-# input_lss_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/input/' \
-#     'limesurvey_survey_593324.lss'
-# output_csv_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/output/' \
-#     'spreadsheet_to_review_593324.csv'
-
-# input_lss_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/input' \
-#     '/limesurvey_survey_969322.lss'
-# output_csv_file_name = \
-#     '/Users/caco/Workspace/fields_translation/fields_translation/output' \
-#     '/spreadsheet_to_review_969322.csv'
-
-input_lss_file_name = \
-    'limesurvey_survey_772619.lss'
-output_csv_file_name = \
-    'spreadsheet_reviewed_772619.csv'
-
-groups = {}
-answers = {}
-
-tree = ET.parse(input_lss_file_name)
-
-# navigate in "groups" elements
-for item in tree.iterfind('groups/rows/row'):
-    # fields to read:
-    #   gid
-    #   language
-    #   group_name (depends of the language)
-    #   group_order
-    gid = item.findtext('gid')
-    language = item.findtext('language')
-
-    if gid not in groups:
-        groups[gid] = {
-            'gid': gid,
-            'group_name': {},
-            'order': item.findtext('group_order'),
-            'questions': {}
-        }
-
-    groups[gid]['group_name'][language] = item.findtext('group_name')
-
-# navigate in "questions" elements
-for item in tree.iterfind('questions/rows/row'):
-
-    # fields to read:
-    #   gid
-    #   qid
-    #   language
-    #   question_order
-    #   type
-    #   title (question_code)
-    #   question (description, depends of the language)
-
-    gid = item.findtext('gid')
-    qid = item.findtext('qid')
-    language = item.findtext('language')
-
-    group = groups[gid]
-
-    if qid not in group['questions']:
-        groups[gid]['questions'][qid] = {
-            'qid': qid,
-            'order': int(item.findtext('question_order')),
-            'type': item.findtext('type'),
-            'question_code': item.findtext('title'),
-            'description': {},
-            'subquestions': {}
-        }
-
-    group['questions'][qid]['description'][language] = item.findtext('question')
-
-# navigate in "subquestions" elements
-for item in tree.iterfind('subquestions/rows/row'):
-
-    # fields to read:
-    #   gid
-    #   language
-    #   qid (subquestion id)
-    #   parent_qid (question id)
-    #   type (corresponde ao tipo da pergunta ou da subpergunta)
-    #   title (subquestion_code)
-    #   question (description, depends of the language)
-    #   question_order
-
-    gid = item.findtext('gid')
-    subquestion_id = item.findtext('qid')
-    language = item.findtext('language')
-    question_id = item.findtext('parent_qid')
-
-    question = groups[gid]['questions'][question_id]
-
-    if subquestion_id not in question['subquestions']:
-        question['subquestions'][subquestion_id] = {
-            'subquestion_id': subquestion_id,
-            'order': item.findtext('question_order'),
-            'subquestion_code': item.findtext('title'),
-            'type': item.findtext('type'),
-            'description': {}
-        }
-
-    question['subquestions'][subquestion_id]['description'][language] = item.findtext('question')
-
-# navigate in "answers" elements
-for item in tree.iterfind('answers/rows/row'):
-    # fields to read:
-    #   qid (subquestion id)
-    #   language
-    #   code (answer code)
-    #   scale_id (scale id, when question type is 'Array Dual Scale')
-    #   answer (description, depends of the language)
-    #   sortorder
-
-    qid = item.findtext('qid')
-    language = item.findtext('language')
-    answer_code = item.findtext('code')
-    scale = item.findtext('scale_id')
-
-    if qid not in answers:
-        answers[qid] = {
-            'qid': qid,
-            'answers': {}
-        }
-
-    subquestion = answers[qid]
-
-    if answer_code not in subquestion['answers']:
-        subquestion['answers'][answer_code] = {
-            'answer_code': answer_code,
-            'order': item.findtext('sortorder'),
-            'scale': scale,
-            'description': {}
-        }
-
-    subquestion['answers'][answer_code]['description'][language] = item.findtext('answer')
+
+def content_hash(*texts):
+    """
+    :param texts: code, type and descriptions of an item
+    :return: hash of the texts
+    """
+    return hashlib.sha1(
+        '\x1f'.join(text or '' for text in texts).encode('UTF-8')
+    ).digest()
+
+
+class PreviousTranslations:
+    """
+    Reviewed codes of a previous version of the spreadsheet, by qid,
+    subquestion id and (qid, answer code), each one with the hash of the
+    content it was reviewed for. A reviewed code is kept only while the
+    item is unchanged.
+    """
+
+    def __init__(self, spreadsheet_file_name=''):
+        # qid -> (hash, translated question code)
+        self.questions = {}
+        # subquestion id -> (hash, translated subquestion code)
+        self.subquestions = {}
+        # (qid, answer code) -> (hash, translated answer code)
+        self.answers = {}
+        if spreadsheet_file_name:
+            self.read(spreadsheet_file_name)
+
+    def read(self, spreadsheet_file_name):
+        with open(spreadsheet_file_name, 'r', newline='',
+                  encoding='UTF-8') as csv_file:
+            reader = csv.reader(csv_file)
+            # header in first line
+            next(reader, None)
+            for line in reader:
+                item = line[3]
+                descriptions = line[10:12]
+                if item == 'question':
+                    self.questions[line[1]] = \
+                        (content_hash(line[4], line[2], *descriptions),
+                         line[5])
+                elif item == 'subquestion':
+                    self.subquestions[line[1]] = \
+                        (content_hash(line[6], *descriptions), line[7])
+                elif item == 'answer':
+                    self.answers[(line[1], line[8])] = \
+                        (content_hash(line[8], *descriptions), line[9])
+
+    @staticmethod
+    def _unchanged(previous, *texts):
+        if previous is not None and previous[0] == content_hash(*texts):
+            return previous[1]
+        return None
+
+    def question_code(self, question, question_type):
+        """
+        :return: reviewed code of the question, None if new or changed
+        """
+        return self._unchanged(
+            self.questions.get(question.qid), question.code, question_type,
+            question.description('pt-BR'), question.description('en')
+        )
+
+    def subquestion_code(self, subquestion):
+        """
+        :return: reviewed code of the subquestion, None if new or changed
+        """
+        return self._unchanged(
+            self.subquestions.get(subquestion.qid), subquestion.code,
+            subquestion.description('pt-BR'), subquestion.description('en')
+        )
+
+    def answer_code(self, answer):
+        """
+        :return: reviewed code of the answer, None if new or changed
+        """
+        return self._unchanged(
+            self.answers.get((answer.qid, answer.code)), answer.code,
+            answer.description('pt-BR'), answer.description('en')
+        )
+
+
+def question_type_name(question):
+    return question.type + ' - ' + question_types[question.type][0]
+
+
+def generate_question_code(question, question_codes):
+    """
+    :param question: Question
+    :param question_codes: CodeAllocator of the question codes
+    :return: new code of the question
+    """
+    translated_question_code = ""
+    if question.code in special_question_codes:
+        translated_question_code = question.code
+    else:
+        if question.type == '*':
+            # formula
+
+            if question.code[:4] == "form":
+                translated_question_code = question_types['*'][1] + question.code[4:]
+            else:
+                translated_question_code = question.code
+        elif question.type == 'X':
+            # boilerplate question
+
+            if question.code[:3] == "tex":
+                translated_question_code = question_types['X'][1] + question.code[3:]
+            else:
+                translated_question_code = question.code
+        else:
+            translated_question_code = code_generator.clean_field(
+                question.description('en'), 20,
+                question_types[question.type][1]
+            )
+
+    return allocate_code(question_codes, translated_question_code)
+
+
+def allocate_code(code_allocator, code):
+    """
+    :param code_allocator: CodeAllocator of the questions, or of the
+    subquestions of a question
+    :param code: generated code
+    :return: unique code
+    """
+    unique_code = code_allocator.allocate(code)
+    if unique_code != code:
+        stats.count('collisions')
+        print("%s jah existente" % code)  # DEBUG
+        print("%s gerado..." % unique_code)  # DEBUG
+    return unique_code
+
+
+def parse_options(argv):
+    usage = 'gen_translation_table.py -l <lss file> -o <csv file> ' \
+            '[-p <previous reviewed csv file>] [--stats <json file>] ' \
+            '[--profile <cProfile file>]'
+    input_lss_file_name = ''
+    output_csv_file_name = ''
+    previous_csv_file_name = ''
+    stats_file_name = ''
+    profile_file_name = ''
+    try:
+        opts, args = getopt.getopt(argv, 'hl:o:p:',
+                                   ['lss=', 'output=', 'previous=', 'stats=',
+                                    'profile='])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit(1)
+        elif opt in ('-l', '--lss'):
+            input_lss_file_name = arg
+        elif opt in ('-o', '--output'):
+            output_csv_file_name = arg
+        elif opt in ('-p', '--previous'):
+            previous_csv_file_name = arg
+        elif opt == '--stats':
+            stats_file_name = arg
+        elif opt == '--profile':
+            profile_file_name = arg
+
+    if input_lss_file_name == '' or output_csv_file_name == '':
+        print(usage)
+        sys.exit(2)
+
+    return [input_lss_file_name, output_csv_file_name, previous_csv_file_name,
+            stats_file_name, profile_file_name]
+
 
 # generate csv file.
 # Fields:
@@ -258,165 +242,214 @@ for item in tree.iterfind('answers/rows/row'):
 #     translated answer code
 #     description in portuguese
 #     description in english
+HEADER = ["group", "question_id", "question_type", "Item",
+          "current question code", "translated question code",
+          "current subquestion code", "translated subquestion code",
+          "current answer code", "translated answer code",
+          "description in portuguese", "description in english"]
 
-rows_to_be_saved = [
-    ["group", "question_id", "question_type", "Item",
-     "current question code", "translated question code",
-     "current subquestion code", "translated subquestion code",
-     "current answer code", "translated answer code",
-     "description in portuguese", "description in english"]
-]
-
-translated_question_codes_list = {}
-untranslated_answer_code_list = []
 
-for group_item in sorted(groups.items(), key=lambda t: t[1]['order']):
-    group = group_item[1]
-
-    for question_item in sorted(group['questions'].items(), key=lambda t: t[1]['order']):
-        question = question_item[1]
+class TranslationTable:
+    """
+    Rows of the spreadsheet of a survey, produced one at a time in the order
+    of the groups, questions, subquestions and answers, so they are written
+    as they are generated.
+    """
 
-        translated_question_code = ""
-        if question['question_code'] in special_question_codes:
-            translated_question_code = question['question_code']
+    def __init__(self, survey, previous):
+        """
+        :param survey: Survey read from the lss file
+        :param previous: PreviousTranslations
+        """
+        self.survey = survey
+        self.previous = previous
+        self.question_codes = CodeAllocator()
+        # number of question/subquestion codes generated (not kept)
+        self.generated_codes = 0
+        self.untranslated_answer_codes = []
+
+        # reviewed codes of unchanged questions are reserved before
+        # generating the codes of the new or changed ones
+        self.kept_question_codes = {}
+        for question in survey.questions.values():
+            if question.gid is None:
+                continue
+            translated_question_code = previous.question_code(
+                question, question_type_name(question)
+            )
+            if translated_question_code is not None:
+                self.kept_question_codes[question.qid] = \
+                    translated_question_code
+                self.question_codes.reserve(translated_question_code)
+
+    def rows(self):
+        """
+        :return: iterator of the rows, without the header
+        """
+        for group in self.survey.sorted_groups():
+            group_name = group.description('pt-BR')
+            for question in group.sorted_questions():
+                yield from self.question_rows(question, group_name)
+
+    def question_rows(self, question, group_name):
+        """
+        :return: iterator of the rows of a question, its subquestions and
+        answers
+        """
+        question_type = question_type_name(question)
+
+        if question.qid in self.kept_question_codes:
+            translated_question_code = self.kept_question_codes[question.qid]
         else:
-            if question['type'] == '*':
-                # formula
-
-                if question['question_code'][:4] == "form":
-                    translated_question_code = question_types['*'][1] + question['question_code'][4:]
-                else:
-                    translated_question_code = question['question_code']
-            elif question['type'] == 'X':
-                # boilerplate question
-
-                if question['question_code'][:3] == "tex":
-                    translated_question_code = question_types['X'][1] + question['question_code'][3:]
-                else:
-                    translated_question_code = question['question_code']
-            else:
-                translated_question_code = clean_field(
-                    question['description']['en'], 20,
-                    question_types[question['type']][1]
-                )
-
-        while True:
-            if translated_question_code not in translated_question_codes_list:
-                translated_question_codes_list[translated_question_code] = 1
-                break
-            else:
-                print("%s jah existente" % translated_question_code)  # DEBUG
-                count = \
-                    translated_question_codes_list[translated_question_code] \
-                    + 1
-                translated_question_codes_list[translated_question_code] = \
-                    count
-                translated_question_code = \
-                    translated_question_code[:-1 * len(str(count))] + \
-                    str(count)
-                print("%s gerado..." % translated_question_code)  # DEBUG
-
-        rows_to_be_saved.append([
-            group['group_name']['pt-BR'],
-            question['qid'],
-            question['type'] + ' - ' + question_types[question['type']][0],
+            self.generated_codes += 1
+            translated_question_code = \
+                generate_question_code(question, self.question_codes)
+
+        yield [
+            group_name,
+            question.qid,
+            question_type,
             'question',
-            question['question_code'],
+            question.code,
             translated_question_code,
             '',
             '',
             '',
             '',
-            question['description']['pt-BR'],
-            question['description']['en']
-        ])
+            question.description('pt-BR'),
+            question.description('en')
+        ]
+
+        subquestion_codes = CodeAllocator()
 
-        translated_subquestion_codes_list = {}
+        kept_subquestion_codes = {}
+        for subquestion in question.subquestions.values():
+            translated_subquestion_code = \
+                self.previous.subquestion_code(subquestion)
+            if translated_subquestion_code is not None:
+                kept_subquestion_codes[subquestion.qid] = \
+                    translated_subquestion_code
+                subquestion_codes.reserve(translated_subquestion_code)
 
-        for subquestion_item in sorted(question['subquestions'].items(), key=lambda t: t[1]['order']):
-            subquestion = subquestion_item[1]
+        for subquestion in question.sorted_subquestions():
 
-            # print('        %s' % subquestion['description']['pt-BR'])
+            # print('        %s' % subquestion.description('pt-BR'))
 
-            if subquestion['subquestion_code'] == "NINA":
-                translated_subquestion_code = "NINA"
+            if subquestion.qid in kept_subquestion_codes:
+                translated_subquestion_code = \
+                    kept_subquestion_codes[subquestion.qid]
             else:
-                translated_subquestion_code = clean_field(subquestion['description']['en'], 20)
+                self.generated_codes += 1
 
-            if not translated_subquestion_code:
-                print("subquestion %s da question %s ficou sem traducao" % (subquestion['subquestion_code'], question['question_code']))
-                translated_subquestion_code = subquestion['subquestion_code']
+                if subquestion.code == "NINA":
+                    translated_subquestion_code = "NINA"
+                else:
+                    translated_subquestion_code = code_generator.clean_field(subquestion.description('en'), 20)
 
-            if translated_subquestion_code not in translated_subquestion_codes_list:
-                translated_subquestion_codes_list[translated_subquestion_code] = 1
-            else:
-                print("%s jah existente" % translated_subquestion_code)  #
-                # DEBUG
-                count = translated_subquestion_codes_list[translated_subquestion_code] + 1
-                translated_subquestion_codes_list[translated_subquestion_code] = count
-                translated_subquestion_code = \
-                    translated_subquestion_code[:-1 * len(str(count))] + \
-                    str(count)
-                print("%s gerado..." % translated_subquestion_code)  # DEBUG
-
-            rows_to_be_saved.append([
-                group['group_name']['pt-BR'],
-                subquestion['subquestion_id'],
-                question['type'] + ' - ' + question_types[question['type']][0],
+                if not translated_subquestion_code:
+                    print("subquestion %s da question %s ficou sem traducao" % (subquestion.code, question.code))
+                    translated_subquestion_code = subquestion.code
+
+                translated_subquestion_code = allocate_code(
+                    subquestion_codes, translated_subquestion_code
+                )
+
+            yield [
+                group_name,
+                subquestion.qid,
+                question_type,
                 'subquestion',
                 '',
                 '',
-                subquestion['subquestion_code'],
+                subquestion.code,
                 translated_subquestion_code,
                 # '',
                 '',
                 '',
-                subquestion['description']['pt-BR'],
-                subquestion['description']['en']
-            ])
-
-        if question['qid'] in answers:
-            question_answers = answers[question['qid']]
+                subquestion.description('pt-BR'),
+                subquestion.description('en')
+            ]
+
+        for answer in question.sorted_answers():
+            # print('            %s' % answer.description('pt-BR'))
+
+            translated_answer_code = self.previous.answer_code(answer)
+            if translated_answer_code is not None:
+                pass
+            elif answer.code in answer_code_translation_list:
+                translated_answer_code = answer_code_translation_list[answer.code]
+            else:
+                translated_answer_code = answer.code
+                self.untranslated_answer_codes.append(answer.code)
+
+            yield [
+                group_name,
+                question.qid,
+                question_type,
+                'answer',
+                '',
+                '',
+                '',
+                '',
+                answer.code,
+                translated_answer_code,
+                answer.description('pt-BR'),
+                answer.description('en')
+            ]
 
-            for answer_item in sorted(question_answers['answers'].items(), key=lambda t: t[1]['order']):
-                answer = answer_item[1]
-                # print('            %s' % answer['description']['pt-BR'])
 
-                translated_answer_code = ""
-                if answer['answer_code'] in answer_code_translation_list:
-                    translated_answer_code = answer_code_translation_list[answer['answer_code']]
-                else:
-                    translated_answer_code = answer['answer_code']
-                    untranslated_answer_code_list.append(answer['answer_code'])
-
-                rows_to_be_saved.append([
-                    group['group_name']['pt-BR'],
-                    question['qid'],
-                    question['type'] + ' - ' + question_types[question['type']][0],
-                    'answer',
-                    '',
-                    '',
-                    '',
-                    '',
-                    answer['answer_code'],
-                    translated_answer_code,
-                    answer['description']['pt-BR'],
-                    answer['description']['en']
-                ])
-
-# Códigos de resposta não traduzidos
-if untranslated_answer_code_list:
-    print('Untranslated answer codes - begin')
-
-    for item in untranslated_answer_code_list:
-        print("\t %s" % item)
-
-    print('Untranslated answer codes - end')
-
-# Generating csv output file
-with open(output_csv_file_name.encode('utf-8'), 'w', newline='', encoding='UTF-8') as csv_file:
-    export_writer = csv.writer(csv_file, quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
-    for row in rows_to_be_saved:
-        export_writer.writerow(row)
-
-print("\n --> The end")
+def generate_translation_table(input_lss_file_name, output_csv_file_name,
+                               previous_csv_file_name=''):
+    """
+    generate the spreadsheet with the codes to be translated/reviewed
+    :param input_lss_file_name: lss file (xml file)
+    :param output_csv_file_name: csv file
+    :param previous_csv_file_name: reviewed spreadsheet of a previous version
+    of the survey. Its codes are kept for the unchanged items, and codes are
+    generated only for new or changed items
+    """
+    with stats.stage('lss_parsing'):
+        survey = read_lss(input_lss_file_name)
+        stats.count('questions', len(survey.questions))
+    with stats.stage('previous_spreadsheet'):
+        previous = PreviousTranslations(previous_csv_file_name)
+
+    # Generating csv output file: rows are written as they are generated
+    with stats.stage('table_generation'):
+        table = TranslationTable(survey, previous)
+        rows = 0
+        with atomic_write(output_csv_file_name, 'w', newline='', encoding='UTF-8') as csv_file:
+            export_writer = csv.writer(csv_file, quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
+            export_writer.writerow(HEADER)
+            for row in table.rows():
+                export_writer.writerow(row)
+                rows += 1
+        stats.count('rows', rows)
+        stats.count('generated', table.generated_codes)
+
+    if previous_csv_file_name:
+        print('%d question/subquestion codes generated, the others were '
+              'kept from %s' % (table.generated_codes, previous_csv_file_name))
+
+    # Códigos de resposta não traduzidos
+    if table.untranslated_answer_codes:
+        print('Untranslated answer codes - begin')
+
+        for item in table.untranslated_answer_codes:
+            print("\t %s" % item)
+
+        print('Untranslated answer codes - end')
+
+
+def main(argv):
+    input_lss_file_name, output_csv_file_name, previous_csv_file_name, \
+        stats_file_name, profile_file_name = parse_options(argv)
+    run(lambda: generate_translation_table(input_lss_file_name,
+                                           output_csv_file_name,
+                                           previous_csv_file_name),
+        stats_file_name, profile_file_name)
+    print("\n --> The end")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,173 @@
+"""
+Instrumentation of the scripts: wall time, counters (rows processed,
+substitutions made, collisions resolved...) and peak memory of each stage,
+reported as json (--stats), and an optional cProfile of the whole run
+(--profile).
+
+Memory is the peak resident memory (RSS) of the process, so it includes
+what C libraries (pandas, lxml) allocate, and costs nothing while the
+stage runs. On Linux the peak is reset at the start of each stage; on
+other systems a stage reports the peak of the process until it ends.
+
+Stages are recorded in the module level Stats object, which does nothing
+until it is enabled, so the code can be instrumented at no cost:
+
+    with stats.stage('lss_parsing'):
+        ...
+        stats.count('rows', rows)
+"""
+
+import cProfile
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from file_utils import atomic_write
+
+# peak RSS of the process (kB), and how to reset it (Linux)
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def peak_rss():
+    """
+    :return: peak resident memory of the process (bytes), since it started
+    or since the last reset_peak_rss()
+    """
+    try:
+        with open(PROC_STATUS) as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    reset the peak resident memory to the current one, where the system
+    allows it (Linux)
+    """
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class Stats:
+    """
+    Records of the stages of a run: stage -> seconds, calls, peak memory
+    (peak RSS of the process, in bytes) and counters
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        # record of the stage running, where counters are added
+        self._current = None
+        self._start = None
+
+    def enable(self):
+        self.enabled = True
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        record the time and memory of a stage. A stage run many times (e.g.
+        for each chunk) is accumulated in the same record
+        :param name: name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = self.stages.setdefault(
+            name, {'seconds': 0.0, 'calls': 0, 'peak_memory': 0}
+        )
+        outer = self._current
+        if outer is not None:
+            # the peak of the outer stage until now, before it is reset
+            outer['peak_memory'] = max(outer['peak_memory'], peak_rss())
+        reset_peak_rss()
+        self._current = record
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['seconds'] += time.perf_counter() - start
+            record['calls'] += 1
+            peak = peak_rss()
+            record['peak_memory'] = max(record['peak_memory'], peak)
+            if outer is not None:
+                outer['peak_memory'] = max(outer['peak_memory'], peak)
+            self._current = outer
+
+    def count(self, counter, value=1):
+        """
+        add to a counter of the stage running. Does nothing outside of a
+        stage or when stats are not enabled
+        :param counter: e.g. 'rows', 'substitutions', 'collisions'
+        :param value: amount added
+        """
+        record = self._current
+        if record is not None:
+            record[counter] = record.get(counter, 0) + value
+
+    def report(self):
+        """
+        :return: json compatible dict with the records of the stages
+        """
+        return {
+            'seconds': time.perf_counter() - self._start
+            if self._start is not None else 0.0,
+            # the peak is reset by each stage
+            'peak_memory': max(
+                [peak_rss()] +
+                [record['peak_memory'] for record in self.stages.values()]
+            ),
+            'stages': self.stages
+        }
+
+    def write(self, stats_file_name):
+        """
+        :param stats_file_name: json file where the report is written
+        """
+        with atomic_write(stats_file_name, 'w', encoding='UTF-8') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
+
+
+stats = Stats()
+
+
+def run(function, stats_file_name='', profile_file_name=''):
+    """
+    run the function with the stats enabled and/or under cProfile
+    :param function: the run, without arguments
+    :param stats_file_name: json file of the stats report, if any
+    :param profile_file_name: file of the cProfile stats (see pstats), if
+    any
+    :return: value returned by function
+    """
+    if stats_file_name:
+        stats.enable()
+
+    if profile_file_name:
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(function)
+        finally:
+            profiler.dump_stats(profile_file_name)
+    else:
+        result = function()
+
+    if stats_file_name:
+        stats.write(stats_file_name)
+    return result
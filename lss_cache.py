@@ -0,0 +1,187 @@
+"""
+On-disk cache of the surveys read from lss files (see survey_model.py),
+keyed by the SHA-256 of the file and the parser version: an unchanged lss
+file is loaded from a pickle instead of being parsed again.
+
+The cache is in the directory of the environment variable LSS_CACHE_DIR
+(default: ~/.cache/limesurvey_fields_translation; empty: no cache), and
+takes at most LSS_CACHE_SIZE bytes (default: 512 MiB). The least recently
+used surveys are removed first.
+"""
+
+import hashlib
+import os
+import pickle
+
+import survey_model
+from file_utils import atomic_write
+from instrumentation import stats
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or
+    os.path.join(os.path.expanduser('~'), '.cache'),
+    'limesurvey_fields_translation'
+)
+DEFAULT_MAX_SIZE = 512 << 20
+
+# size of the blocks of the lss file hashed at a time
+BLOCK_SIZE = 1 << 20
+
+EXTENSION = '.pickle'
+
+
+def file_digest(file_name):
+    """
+    :return: SHA-256 of the content of a file (hex)
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _described(survey):
+    for group in survey.groups.values():
+        yield group
+    for question in survey.questions.values():
+        yield question
+        yield from question.subquestions.values()
+        yield from question.answers.values()
+
+
+def _move_descriptions(survey, languages):
+    # the texts of a cached survey are in the positions its languages had
+    # in the process that read it
+    positions = [survey_model.language_position(language)
+                 for language in languages]
+    if positions == list(range(len(positions))):
+        return
+    for record in _described(survey):
+        descriptions = [None] * (max(positions) + 1)
+        for position, text in zip(positions, record.descriptions):
+            descriptions[position] = text
+        record.descriptions = descriptions
+
+
+class SurveyCache:
+    """
+    Surveys read from lss files, stored as <sha256>-<parser version>.pickle
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: cache directory, created when the first survey is
+        stored
+        :param max_size: bytes taken by the cached surveys at most
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def entry_file_name(self, digest):
+        return os.path.join(self.directory, '%s-%d%s' % (
+            digest, survey_model.PARSER_VERSION, EXTENSION
+        ))
+
+    def load(self, digest):
+        """
+        :param digest: SHA-256 of the lss file
+        :return: Survey, or None if it is not cached
+        """
+        file_name = self.entry_file_name(digest)
+        try:
+            with open(file_name, 'rb') as f:
+                languages, survey = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # unreadable (e.g. written by an incompatible version): read
+            # the lss file again
+            self.remove(file_name)
+            return None
+        # most recently used
+        try:
+            os.utime(file_name)
+        except OSError:
+            pass
+        _move_descriptions(survey, languages)
+        return survey
+
+    def store(self, digest, survey):
+        """
+        :param digest: SHA-256 of the lss file
+        :param survey: Survey read from it
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        languages = list(survey_model.language_positions)
+        with atomic_write(self.entry_file_name(digest), 'wb') as f:
+            pickle.dump((languages, survey), f, pickle.HIGHEST_PROTOCOL)
+        self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used surveys until the cache takes at most
+        max_size bytes
+        """
+        entries = []
+        with os.scandir(self.directory) as files:
+            for entry in files:
+                if entry.name.endswith(EXTENSION):
+                    status = entry.stat()
+                    entries.append(
+                        (status.st_mtime_ns, status.st_size, entry.path)
+                    )
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, file_name in sorted(entries):
+            if size <= self.max_size:
+                break
+            self.remove(file_name)
+            size -= entry_size
+
+    @staticmethod
+    def remove(file_name):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
+
+    def read_lss(self, lss_file_name):
+        """
+        :param lss_file_name: lss file (xml file)
+        :return: Survey, from the cache if the file was read before
+        """
+        digest = file_digest(lss_file_name)
+        survey = self.load(digest)
+        if survey is not None:
+            stats.count('cache_hits')
+            return survey
+        survey = survey_model.read_lss(lss_file_name)
+        try:
+            self.store(digest, survey)
+        except OSError as error:
+            print('Survey not cached: %s' % error)
+        return survey
+
+
+def get_cache():
+    """
+    :return: SurveyCache of LSS_CACHE_DIR and LSS_CACHE_SIZE, or None if
+    LSS_CACHE_DIR is empty
+    """
+    directory = os.environ.get('LSS_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if not directory:
+        return None
+    return SurveyCache(directory, int(os.environ.get('LSS_CACHE_SIZE',
+                                                     DEFAULT_MAX_SIZE)))
+
+
+def read_lss(lss_file_name):
+    """
+    read a lss file through the cache (see get_cache)
+    :param lss_file_name: lss file (xml file)
+    :return: Survey
+    """
+    cache = get_cache()
+    if cache is None:
+        return survey_model.read_lss(lss_file_name)
+    return cache.read_lss(lss_file_name)
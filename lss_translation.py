@@ -0,0 +1,281 @@
+"""
+Translation of the LimeSurvey lss (structure) files: question, subquestion
+and answer codes, codes in formulas and texts, relevance equations and
+conditions, one <row> at a time.
+
+Rows can be translated in a parsed tree (translate_tree) or while the file
+is read (rewrite_lss_stream): the rows are then read event by event,
+translated as each one completes, written and discarded, so memory is
+bounded by the largest row instead of the survey. Both write the same
+bytes as xml.etree.ElementTree.write.
+"""
+
+import io
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from code_matcher import CodeMatcher
+from expression_manager import RelevanceRewriter
+from instrumentation import stats
+from xml_backend import backend
+
+# size of the blocks fed to the parser
+BLOCK_SIZE = 1 << 16
+
+# sections whose rows are translated, in the order they are translated in a
+# parsed tree
+SECTIONS = ('questions', 'subquestions', 'answers', 'conditions')
+
+# element whose serialization marks the end of an opening tag
+_SENTINEL = '_'
+
+
+class LssTranslator:
+    """
+    Translators of the rows of each section. Each one translates a row in
+    place and returns the number of codes replaced.
+    """
+
+    def __init__(self, survey):
+        """
+        :param survey: Survey with the original and translated codes
+        """
+        self.survey = survey
+        self.questions = survey.question_codes
+        # all question codes, matched at once in formulas and texts
+        self.question_code_matcher = CodeMatcher({
+            question_code: question.translated_code
+            for question_code, question in self.questions.items()
+        })
+        self.relevance_rewriter = RelevanceRewriter(survey)
+        self.row_translators = {
+            'questions': self.question_row,
+            'subquestions': self.subquestion_row,
+            'answers': self.answer_row,
+            'conditions': self.condition_row
+        }
+
+    def question_row(self, item):
+        """
+        translate the question code, the codes in formulas and texts, and
+        the relevance equation of a question
+        """
+        substitutions = 0
+        questions = self.questions
+        # fields to read: gid, qid, language, question_order, type, title
+        # (question_code), question (description, depends of the language)
+        question_code = item.findtext('title')
+        if question_code in questions:
+            item.find('title').text = questions[question_code].translated_code
+            substitutions += 1
+
+        # translate formulas and texts
+        if item.findtext('type') in ("*", "X"):
+            question_text = item.find('question')
+            question_text.text, count = \
+                self.question_code_matcher.subn(question_text.text)
+            substitutions += count
+
+        # Translation of relevance field (related to conditions)
+        # Examples of relevance:
+        #   (1) 1
+        #   (2) ((256242X320X16516.NAOK == "S"))
+        #   (3) ((256242X320X16517Outro.NAOK == "Y"))
+        #   (4) ((256242X319X16495.NAOK == "D" or 256242X319X16495.NAOK == "DE"))
+        #   (5) ((256242X322X17689Trofismo#1.NAOK == "P"))
+        #
+        #   *Example (1): não há nada para fazer
+        #   *Example (2): questão 16516 não contém subquestion, temos que
+        # traduzir somente a resposta
+        #   *Example (3): questão 16517 contém subquestion, temos que
+        # traduzir a subquestion e a resposta
+        #   *Example (4): podemos encontrar mais do que uma parte para traduzir
+        #   *Example (5): às vezes a subquestion vem com um sufixo '#'
+
+        relevance = item.find('relevance')
+        if relevance is not None:
+            rewritten = self.relevance_rewriter.rewrite(relevance.text)
+            if rewritten != relevance.text:
+                relevance.text = rewritten
+                stats.count('relevance_rewrites')
+        return substitutions
+
+    def subquestion_row(self, item):
+        """
+        translate the code of a subquestion
+        """
+        # fields to read: gid, language, qid (subquestion id),
+        # parent_qid (question id), type (corresponde ao tipo da pergunta ou
+        # da subpergunta), title (subquestion_code), question (description,
+        # depends of the language), question_order
+        question = self.survey.questions.get(item.findtext('parent_qid'))
+        if question is not None:
+            subquestion_code = item.findtext('title')
+            if subquestion_code in question.subquestion_codes:
+                item.find('title').text = \
+                    question.subquestion_codes[subquestion_code].translated_code
+                return 1
+        return 0
+
+    def answer_row(self, item):
+        """
+        translate the code of an answer
+        """
+        # fields to read: qid (question id), code (answer code)
+        question = self.survey.questions.get(item.findtext('qid'))
+        if question is not None:
+            answer_code = item.findtext('code')
+            if answer_code in question.answers:
+                item.find('code').text = \
+                    question.answers[answer_code].translated_code
+                return 1
+        return 0
+
+    def condition_row(self, item):
+        """
+        translate the subquestion code of the field name and the answer code
+        of the value of a condition
+        """
+        substitutions = 0
+        question = self.survey.questions.get(item.findtext('cqid'))
+        if question is not None:
+            # translate subquestion
+            if question.subquestion_codes:
+                field_name = item.findtext('cfieldname')
+                fields = field_name.split('X', maxsplit=2)
+                pieces = fields[-1].split('#')
+                subquestion_code = pieces[0].replace(question.qid, '')
+                if subquestion_code in question.subquestion_codes:
+                    item.find('cfieldname').text = \
+                        'X'.join(fields[:-1] +
+                                 ['#'.join([question.qid +
+                                            question.subquestion_codes[
+                                                subquestion_code
+                                            ].translated_code] +
+                                           pieces[1:])])
+                    substitutions += 1
+                else:
+                    print("Subquestion %s deveria existir" % subquestion_code)
+            # translate answer
+            answer_code = item.findtext('value')
+            if answer_code in question.answers:
+                item.find('value').text = \
+                    question.answers[answer_code].translated_code
+                substitutions += 1
+        return substitutions
+
+    def translate_tree(self, tree):
+        """
+        translate the rows of a parsed lss file, section by section
+        :param tree: tree parsed by the xml backend
+        """
+        for section in SECTIONS:
+            with stats.stage('lss_' + section):
+                translate_row = self.row_translators[section]
+                rows = substitutions = 0
+                for item in backend.rows(tree, section):
+                    rows += 1
+                    substitutions += translate_row(item)
+                stats.count('rows', rows)
+                stats.count('substitutions', substitutions)
+
+
+def _opening_tag(element):
+    # opening tag and text, as written by ElementTree
+    shell = ET.Element(element.tag, element.attrib)
+    shell.text = element.text
+    ET.SubElement(shell, _SENTINEL)
+    content = ET.tostring(shell, encoding='unicode')
+    return content[:content.rindex('<' + _SENTINEL)]
+
+
+def _element(element):
+    # element and its children, as written by ElementTree, without the tail:
+    # the parser may have read it already, but it is written after the
+    # element is removed
+    tail = element.tail
+    element.tail = None
+    content = ET.tostring(element, encoding='unicode')
+    element.tail = tail
+    return content
+
+
+def rewrite_lss_stream(lss_input_file, output, row_translators):
+    """
+    read a lss file event by event and write it with the rows translated.
+    Each document/<section>/rows/row (and any other element at that depth)
+    is written and discarded as soon as it is complete; the elements above
+    it are written as they are opened and closed
+    :param lss_input_file: original lss file
+    :param output: binary file object
+    :param row_translators: dict section -> function that translates a row
+    in place and returns the number of codes replaced
+    :return: (rows read, codes replaced)
+    """
+    writer = io.TextIOWrapper(output, encoding='UTF-8',
+                              errors='xmlcharrefreplace', newline='')
+    writer.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+
+    # the parser reports the events of a whole block at once: when an event
+    # is read, the elements may already have the texts and tails that
+    # follow it
+
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    # open elements (document, section, rows, row...)
+    elements = []
+    # elements above the rows whose opening tag was already written
+    opened = set()
+    # element written last, whose tail is written when it is known
+    pending_tail = None
+    rows = substitutions = 0
+
+    def write_pending_tail():
+        nonlocal pending_tail
+        if pending_tail is not None and pending_tail.tail:
+            writer.write(escape(pending_tail.tail))
+        pending_tail = None
+
+    with open(lss_input_file, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(BLOCK_SIZE), b''):
+            parser.feed(block)
+            for event, element in parser.read_events():
+                depth = len(elements)
+                if event == 'start':
+                    elements.append(element)
+                    if depth < 4:
+                        # the text of the parent is complete
+                        write_pending_tail()
+                        if depth and id(elements[-2]) not in opened:
+                            writer.write(_opening_tag(elements[-2]))
+                            opened.add(id(elements[-2]))
+                    continue
+
+                elements.pop()
+                depth -= 1
+                if depth > 3:
+                    continue
+
+                write_pending_tail()
+                if depth == 3:
+                    # row: translated and written whole
+                    if elements[2].tag == 'rows':
+                        translate_row = row_translators.get(elements[1].tag)
+                        if translate_row is not None:
+                            rows += 1
+                            substitutions += translate_row(element)
+                    writer.write(_element(element))
+                elif id(element) in opened:
+                    opened.discard(id(element))
+                    writer.write('</%s>' % element.tag)
+                else:
+                    # without children
+                    writer.write(_element(element))
+
+                if elements:
+                    elements[-1].remove(element)
+                    pending_tail = element
+        parser.close()
+
+    writer.flush()
+    writer.detach()
+    return rows, substitutions
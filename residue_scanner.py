@@ -0,0 +1,181 @@
+"""
+Verification of the translated files: original codes left in the _new lss
+file and in the header of the _new vv file (residues).
+
+Only the original codes that were changed, and that are not also a
+translated code, are residues. Every text field of every row of the lss
+file (questions, relevance, conditions, attributes...) is scanned once by
+a single regular expression that matches both the original question codes
+(factored as a trie, see code_matcher.py) and the SGQA names of relevance
+equations and conditions, whose subquestion codes are checked. The
+subquestion and answer code fields are checked by lookup.
+"""
+
+import re
+from collections import namedtuple
+
+from code_matcher import CODE_END, CODE_START, trie_pattern
+from expression_manager import RelevanceRewriter
+from xml_backend import backend
+
+SGQA = r'(?P<sgqa>(?<![0-9A-Za-z_])\d+X\d+X(?P<qid_code>\d+[0-9A-Za-z]*))'
+
+# vv field names: <question>[_<subquestion>[_<subquestion>]][#<scale>|comment]
+FIELD_SUFFIX = re.compile(r'(#\d+|comment)$')
+
+# location: e.g. 'survey_new.lss: questions row 12 (qid 16517) relevance'
+Residue = namedtuple('Residue', ['location', 'code', 'text'])
+
+
+def _changed_codes(items):
+    """
+    :param items: Question, Subquestion or Answer objects with the codes of
+    the same scope
+    :return: original codes that were changed and are not a translated code
+    """
+    translated_codes = {item.translated_code for item in items}
+    return frozenset(
+        item.code for item in items
+        if item.code and item.code != item.translated_code and
+        item.code not in translated_codes
+    )
+
+
+class ResidueScanner:
+    """
+    Finds original codes left in translated files
+    """
+
+    def __init__(self, survey):
+        """
+        :param survey: Survey with the original and translated codes
+        """
+        self.survey = survey
+        questions = list(survey.question_codes.values())
+        self.question_codes = _changed_codes(questions)
+        # qid -> original subquestion / answer codes that must not be left
+        self.subquestion_codes = {
+            question.qid:
+                _changed_codes(list(question.subquestion_codes.values()))
+            for question in questions
+        }
+        self.answer_codes = {
+            question.qid: _changed_codes(list(question.answers.values()))
+            for question in questions
+        }
+        self.translated_questions = {
+            question.translated_code: question for question in questions
+        }
+        self.resolver = RelevanceRewriter(survey)
+
+        pattern = trie_pattern(self.question_codes)
+        if pattern is not None:
+            pattern = '(?P<code>' + CODE_START + pattern + CODE_END + ')|' \
+                + SGQA
+        else:
+            pattern = SGQA
+        self.regex = re.compile(pattern)
+
+    def scan_text(self, text):
+        """
+        :param text: text of a field
+        :return: iterator of the original codes found in the text
+        """
+        if not text:
+            return
+        for match in self.regex.finditer(text):
+            if match.lastgroup == 'code':
+                yield match.group()
+            else:
+                question, subquestion = \
+                    self.resolver.resolve(match.group('qid_code'))
+                if subquestion is not None and subquestion.code in \
+                        self.subquestion_codes.get(question.qid, ()):
+                    yield match.group()
+
+    def scan_row(self, section, row):
+        """
+        :param section: section of the lss file, e.g. 'questions'
+        :param row: row element
+        :return: iterator of (field name, code, text)
+        """
+        for field in row:
+            for code in self.scan_text(field.text):
+                yield field.tag, code, field.text
+
+        if section == 'subquestions':
+            code = row.findtext('title')
+            if code in self.subquestion_codes.get(
+                    row.findtext('parent_qid'), ()):
+                yield 'title', code, code
+        elif section == 'answers':
+            code = row.findtext('code')
+            if code in self.answer_codes.get(row.findtext('qid'), ()):
+                yield 'code', code, code
+        elif section == 'conditions':
+            code = row.findtext('value')
+            if code in self.answer_codes.get(row.findtext('cqid'), ()):
+                yield 'value', code, code
+
+    def scan_lss(self, lss_file_name):
+        """
+        :param lss_file_name: translated lss file
+        :return: list of Residue
+        """
+        residues = []
+        # open elements: document, section, rows, row, ...
+        elements = []
+        # row number in its section
+        rows = 0
+        for event, element in backend.iterparse(lss_file_name,
+                                                events=('start', 'end')):
+            if event == 'start':
+                if len(elements) == 1:
+                    rows = 0
+                elements.append(element)
+                continue
+            elements.pop()
+            # document/<section>/rows/row
+            if len(elements) != 3 or elements[2].tag != 'rows':
+                if len(elements) < 3:
+                    element.clear()
+                continue
+            section = elements[1].tag
+            rows += 1
+            for field_name, code, text in self.scan_row(section, element):
+                qid = element.findtext('qid')
+                residues.append(Residue(
+                    '%s: %s row %d%s %s' % (
+                        lss_file_name, section, rows,
+                        ' (qid %s)' % qid if qid else '', field_name
+                    ), code, text
+                ))
+            # rows already scanned are not needed anymore
+            elements[2].remove(element)
+        return residues
+
+    def scan_vv_header(self, vv_file_name):
+        """
+        :param vv_file_name: translated vv file
+        :return: list of Residue
+        """
+        with open(vv_file_name, 'r') as vv_file:
+            # first line: question texts
+            vv_file.readline()
+            header = vv_file.readline().rstrip('\r\n')
+
+        residues = []
+        for column, field_name in enumerate(header.split('\t'), 1):
+            location = '%s: header column %d' % (vv_file_name, column)
+            for code in self.scan_text(field_name):
+                residues.append(Residue(location, code, field_name))
+
+            pieces = FIELD_SUFFIX.sub('', field_name).split('_')
+            question = self.translated_questions.get(pieces[0])
+            if question is None:
+                continue
+            subquestion_codes = self.subquestion_codes.get(question.qid, ())
+            for code in pieces[1:3]:
+                if code in subquestion_codes:
+                    residues.append(Residue(location, code, field_name))
+        return residues
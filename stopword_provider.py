@@ -0,0 +1,72 @@
+"""
+Stop words used in code generation, loaded without network access.
+
+The english list is a snapshot of the NLTK 'stopwords' corpus bundled in
+data/stopwords. When the snapshot is not available, the list is read from a
+local NLTK corpus, but only if one is configured (NLTK_DATA environment
+variable or the nltk_data argument); it is never downloaded.
+"""
+
+import os
+
+BUNDLED_STOPWORDS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'stopwords'
+)
+
+# language -> list of stop words already loaded
+_loaded = {}
+
+
+def read_bundled_stopwords(language):
+    """
+    :param language: language of the list, e.g. 'english'
+    :return: list of stop words, or None if there is no bundled list
+    """
+    file_name = os.path.join(BUNDLED_STOPWORDS_DIR, language)
+    if not os.path.isfile(file_name):
+        return None
+    with open(file_name, 'r', encoding='UTF-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def read_nltk_stopwords(language, nltk_data=None):
+    """
+    :param language: language of the list, e.g. 'english'
+    :param nltk_data: directory of a local NLTK corpus. Defaults to the
+    NLTK_DATA environment variable
+    :return: list of stop words, or None if no local corpus is configured
+    """
+    nltk_data = nltk_data or os.environ.get('NLTK_DATA')
+    if not nltk_data:
+        return None
+
+    import nltk
+    from nltk.corpus import stopwords
+
+    for path in reversed(nltk_data.split(os.pathsep)):
+        if path not in nltk.data.path:
+            nltk.data.path.insert(0, path)
+    return stopwords.words(language)
+
+
+def load_stopwords(language='english', nltk_data=None):
+    """
+    stop words of a language, read once and kept for the next calls
+    :param language: language of the list, e.g. 'english'
+    :param nltk_data: directory of a local NLTK corpus used when there is no
+    bundled list
+    :return: list of stop words
+    """
+    words = _loaded.get(language)
+    if words is None:
+        words = read_bundled_stopwords(language)
+        if words is None:
+            words = read_nltk_stopwords(language, nltk_data)
+        if words is None:
+            raise LookupError(
+                'No stop words for %s: %s is missing and no local NLTK '
+                'corpus is configured (NLTK_DATA)'
+                % (language, BUNDLED_STOPWORDS_DIR)
+            )
+        _loaded[language] = words
+    return list(words)
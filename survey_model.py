@@ -0,0 +1,351 @@
+"""
+Compact in-memory model of a LimeSurvey survey (groups, questions,
+subquestions and answers), shared by gen_translation_table.py and
+translate_codes.py.
+
+Records use __slots__ and keep their per-language texts in a list indexed by
+the position of the (interned) language tag, instead of one dict per record.
+The survey keeps indexes by qid, gid and question code, so every lookup is
+O(1).
+"""
+
+import sys
+
+from xml_backend import backend
+
+# version of the survey model and of read_lss: surveys cached by another
+# version are read again (see lss_cache.py)
+PARSER_VERSION = 1
+
+
+def intern(text):
+    """
+    intern short repeated strings (types, language tags), keeping None
+    """
+    return text if text is None else sys.intern(text)
+
+
+def parse_order(text):
+    """
+    order fields (and ids) are sorted as integers, so '10' comes after '2'
+    :param text: e.g. question_order
+    :return: integer, 0 if missing or not a number
+    """
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return 0
+
+
+# language tag -> position of its text in the records' description lists
+language_positions = {}
+
+
+def language_position(language):
+    """
+    position of a language in the description lists, registering it on
+    first use
+    :param language: language tag, e.g. 'pt-BR'
+    :return: position of the language
+    """
+    position = language_positions.get(language)
+    if position is None:
+        language = intern(language)
+        position = language_positions.setdefault(
+            language, len(language_positions)
+        )
+    return position
+
+
+class Described:
+    """
+    base class for records that have a text per language
+    """
+    __slots__ = ('descriptions',)
+
+    def __init__(self):
+        self.descriptions = []
+
+    def description(self, language, default=None):
+        position = language_positions.get(language)
+        if position is None or position >= len(self.descriptions):
+            return default
+        text = self.descriptions[position]
+        return default if text is None else text
+
+    def set_description(self, language, text):
+        position = language_position(language)
+        missing = position + 1 - len(self.descriptions)
+        if missing > 0:
+            self.descriptions.extend([None] * missing)
+        self.descriptions[position] = text
+
+
+class Group(Described):
+    __slots__ = ('gid', 'order', 'questions')
+
+    def __init__(self, gid, order=None):
+        super().__init__()
+        self.gid = gid
+        self.order = order
+        # qid -> Question
+        self.questions = {}
+
+    def sort_key(self):
+        return self.order, parse_order(self.gid)
+
+    def sorted_questions(self):
+        return sorted(self.questions.values(), key=Question.sort_key)
+
+
+class Question(Described):
+    __slots__ = ('qid', 'gid', 'order', 'type', 'code', 'translated_code',
+                 'subquestions', 'subquestion_codes', 'answers')
+
+    def __init__(self, qid):
+        super().__init__()
+        self.qid = qid
+        self.gid = None
+        self.order = None
+        self.type = None
+        self.code = None
+        self.translated_code = None
+        # subquestion qid -> Subquestion
+        self.subquestions = {}
+        # subquestion code -> Subquestion
+        self.subquestion_codes = {}
+        # answer code -> Answer
+        self.answers = {}
+
+    def add_subquestion(self, subquestion):
+        self.subquestions[subquestion.qid] = subquestion
+        self.subquestion_codes.setdefault(subquestion.code, subquestion)
+        return subquestion
+
+    def add_answer(self, answer):
+        return self.answers.setdefault(answer.code, answer)
+
+    def sort_key(self):
+        return self.order, parse_order(self.qid)
+
+    def sorted_subquestions(self):
+        return sorted(self.subquestions.values(), key=Subquestion.sort_key)
+
+    def sorted_answers(self):
+        return sorted(self.answers.values(), key=Answer.sort_key)
+
+
+class Subquestion(Described):
+    __slots__ = ('qid', 'parent_qid', 'order', 'type', 'code',
+                 'translated_code')
+
+    def __init__(self, qid, parent_qid, code, order=None, type=None,
+                 translated_code=None):
+        super().__init__()
+        self.qid = qid
+        self.parent_qid = parent_qid
+        self.order = order
+        self.type = intern(type)
+        self.code = code
+        self.translated_code = translated_code
+
+    def sort_key(self):
+        return self.order, parse_order(self.qid)
+
+
+class Answer(Described):
+    __slots__ = ('qid', 'code', 'translated_code', 'order', 'scale')
+
+    def __init__(self, qid, code, order=None, scale=None,
+                 translated_code=None):
+        super().__init__()
+        self.qid = qid
+        self.code = code
+        self.translated_code = translated_code
+        self.order = order
+        self.scale = scale
+
+    def sort_key(self):
+        return self.order, self.code
+
+
+class Survey:
+    __slots__ = ('groups', 'questions', 'question_codes')
+
+    def __init__(self):
+        # gid -> Group
+        self.groups = {}
+        # qid -> Question
+        self.questions = {}
+        # question code -> Question
+        self.question_codes = {}
+
+    def group(self, gid, order=None):
+        """
+        group with the given gid, created if it does not exist yet
+        """
+        group = self.groups.get(gid)
+        if group is None:
+            group = self.groups[gid] = Group(gid, order)
+        return group
+
+    def question(self, qid):
+        """
+        question with the given qid, created if it does not exist yet (e.g.
+        answers are read before the questions they belong to)
+        """
+        question = self.questions.get(qid)
+        if question is None:
+            question = self.questions[qid] = Question(qid)
+        return question
+
+    def sorted_groups(self):
+        return sorted(self.groups.values(), key=Group.sort_key)
+
+    def add_question(self, qid, gid, code, order=None, type=None,
+                     translated_code=None):
+        question = self.question(qid)
+        question.gid = gid
+        question.code = code
+        question.order = order
+        question.type = intern(type)
+        question.translated_code = translated_code
+        self.question_codes.setdefault(code, question)
+        if gid is not None:
+            self.group(gid).questions[qid] = question
+        return question
+
+
+def read_group_row(item, survey):
+    # fields to read:
+    #   gid
+    #   language
+    #   group_name (depends of the language)
+    #   group_order
+    group = survey.group(item.findtext('gid'))
+    if group.order is None:
+        group.order = parse_order(item.findtext('group_order'))
+
+    group.set_description(item.findtext('language'),
+                          item.findtext('group_name'))
+
+
+def read_question_row(item, survey):
+    # fields to read:
+    #   gid
+    #   qid
+    #   language
+    #   question_order
+    #   type
+    #   title (question_code)
+    #   question (description, depends of the language)
+    gid = item.findtext('gid')
+    qid = item.findtext('qid')
+
+    question = survey.groups[gid].questions.get(qid)
+    if question is None:
+        question = survey.add_question(
+            qid, gid, item.findtext('title'),
+            order=parse_order(item.findtext('question_order')),
+            type=item.findtext('type')
+        )
+
+    question.set_description(item.findtext('language'),
+                             item.findtext('question'))
+
+
+def read_subquestion_row(item, survey):
+    # fields to read:
+    #   gid
+    #   language
+    #   qid (subquestion id)
+    #   parent_qid (question id)
+    #   type (corresponde ao tipo da pergunta ou da subpergunta)
+    #   title (subquestion_code)
+    #   question (description, depends of the language)
+    #   question_order
+    gid = item.findtext('gid')
+    subquestion_id = item.findtext('qid')
+    question_id = item.findtext('parent_qid')
+
+    question = survey.groups[gid].questions[question_id]
+
+    subquestion = question.subquestions.get(subquestion_id)
+    if subquestion is None:
+        subquestion = question.add_subquestion(Subquestion(
+            subquestion_id, question_id, item.findtext('title'),
+            order=parse_order(item.findtext('question_order')),
+            type=item.findtext('type')
+        ))
+
+    subquestion.set_description(item.findtext('language'),
+                                item.findtext('question'))
+
+
+def read_answer_row(item, survey):
+    # fields to read:
+    #   qid (question id)
+    #   language
+    #   code (answer code)
+    #   scale_id (scale id, when question type is 'Array Dual Scale')
+    #   answer (description, depends of the language)
+    #   sortorder
+    qid = item.findtext('qid')
+    answer_code = item.findtext('code')
+
+    question = survey.question(qid)
+
+    answer = question.answers.get(answer_code)
+    if answer is None:
+        answer = question.add_answer(Answer(
+            qid, answer_code, order=parse_order(item.findtext('sortorder')),
+            scale=item.findtext('scale_id')
+        ))
+
+    answer.set_description(item.findtext('language'),
+                           item.findtext('answer'))
+
+
+# section of the lss file -> function that reads one of its rows
+row_readers = {
+    'groups': read_group_row,
+    'questions': read_question_row,
+    'subquestions': read_subquestion_row,
+    'answers': read_answer_row
+}
+
+
+def read_lss(lss_file_name):
+    """
+    read groups, questions, subquestions and answers of a lss file in a
+    single streaming pass. Each <row> is discarded as soon as it is read, so
+    memory does not grow with the size of the lss file.
+    :param lss_file_name: lss file (xml file)
+    :return: Survey
+    """
+    survey = Survey()
+    # open elements: document, section, rows, row, ...
+    elements = []
+
+    for event, element in backend.iterparse(lss_file_name,
+                                            events=('start', 'end')):
+        if event == 'start':
+            elements.append(element)
+            continue
+
+        elements.pop()
+
+        # only document/<section>/rows/row is of interest
+        if len(elements) != 3 or elements[2].tag != 'rows':
+            if len(elements) < 3:
+                element.clear()
+            continue
+
+        row_reader = row_readers.get(elements[1].tag)
+        if row_reader:
+            row_reader(element, survey)
+
+        # rows already read are not needed anymore
+        elements[2].remove(element)
+
+    return survey
@@ -8,16 +8,15 @@ structure, original data file
 Outputs: data file with translated codes, questionnaire structure file with
 translated codes
 
+The reviewed spreadsheet is validated before any file is translated (see
+validation.py): untranslated codes, whitespace or special characters in
+codes, codes longer than the limits (question: 20, subquestion: 20, answer:
+5 characters) and duplicated codes.
+The translated files are scanned for original codes left in them (see
+residue_scanner.py).
+
 TODO:
-Initial validations:
-- check for any untranslated code
-- check if any code contains whitespace or any special characters
-- check if any code has exceeded the maximum allowed character size:
-    question: limit = 20 characters
-    subquestion: limit = 20 characters
-    answer: limit = 5 characters
 End validations:
-- check for any of the questions/subquestions/answers throughout the text
 - check if the questionnaire still works properly using it in NES
 - list the translations equal to originals
 Functional tests:
@@ -40,30 +39,54 @@ Functional tests:
 
 import csv
 import getopt
-import sys
 import os
-from xml.etree import ElementTree as ETree
-from shutil import copyfile
+import sys
 
-import pandas
+from file_utils import atomic_write, new_file_name
+from instrumentation import run, stats
+from lss_translation import LssTranslator, rewrite_lss_stream
+from residue_scanner import ResidueScanner
+from survey_model import Answer, Subquestion, Survey
+from translation_map import StaleMapError, file_sha256, \
+    read_translation_map, write_translation_map
+from validation import ValidationError, validate_spreadsheet
+from vv_translation import DEFAULT_CHUNK_SIZE, FieldIndex, \
+    translate_vv_file
+from xml_backend import backend
+
+
+USAGE = 'translate_codes.py [-l <inputfile1>] -a <inputfile2> ' \
+        '(-r <inputfile3> | -m <translation map> [-r <inputfile3>]) ' \
+        '[--chunk-size <rows>] ' \
+        '[--jobs <processes>]\n' \
+        '       translate_codes.py -r <inputfile3> -c <translation map>\n' \
+        'options: [--streaming] [--stats <json file>] ' \
+        '[--profile <cProfile file>]'
 
 
 def parse_options(argv):
     lss_input_file = ''
     answers_input_file = ''
     spreadsheet_input_file = ''
+    translation_map_file = ''
+    compiled_map_file = ''
+    chunk_size = DEFAULT_CHUNK_SIZE
+    jobs = 1
+    stats_file = ''
+    profile_file = ''
+    streaming = False
     try:
         opts, args = getopt.getopt(
-            argv, 'hl:a:r:', ['lss=', 'answer=', 'reviewed=']
+            argv, 'hl:a:r:m:c:j:', ['lss=', 'answer=', 'reviewed=', 'map=',
+                                    'compile=', 'chunk-size=', 'jobs=',
+                                    'stats=', 'profile=', 'streaming']
         )
     except getopt.GetoptError:
-        print('translate_codes.py -l <inputfile1> -a <inputfile2> -r '
-              '<inputfile3>')
+        print(USAGE)
         sys.exit(2)
     for opt, arg in opts:
         if opt == '-h':
-            print('translate_codes.py -l <inputfile1> -a <inputfile2> -r '
-                  '<inputfile3>')
+            print(USAGE)
             sys.exit(1)
         elif opt in ('-l', '--lss'):
             lss_input_file = arg
@@ -71,311 +94,290 @@ def parse_options(argv):
             answers_input_file = arg
         elif opt in ('-r', '--reviewed'):
             spreadsheet_input_file = arg
-
-    if lss_input_file == '' or answers_input_file == '' or \
-            spreadsheet_input_file == '':
-        print('translate_codes.py -l <inputfile1> -a <inputfile2> -r '
-              '<inputfile3>')
+        elif opt in ('-m', '--map'):
+            translation_map_file = arg
+        elif opt in ('-c', '--compile'):
+            compiled_map_file = arg
+        elif opt == '--chunk-size':
+            chunk_size = int(arg)
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
+        elif opt == '--stats':
+            stats_file = arg
+        elif opt == '--profile':
+            profile_file = arg
+        elif opt == '--streaming':
+            streaming = True
+
+    if compiled_map_file:
+        # compile the reviewed spreadsheet only
+        valid = spreadsheet_input_file != ''
+    else:
+        # the lss file is optional: without it only the vv file is
+        # translated. With a translation map, the spreadsheet is only
+        # checked to be the one it was compiled from
+        valid = answers_input_file != '' and \
+            (spreadsheet_input_file != '' or translation_map_file != '')
+    if not valid:
+        print(USAGE)
         sys.exit(2)
 
-    return [lss_input_file, answers_input_file, spreadsheet_input_file]
+    return [lss_input_file, answers_input_file, spreadsheet_input_file,
+            translation_map_file, compiled_map_file, chunk_size, jobs,
+            stats_file, profile_file, streaming]
 
 
-def main(argv):
-    lss_input_file, answers_input_file, spreadsheet_input_file = \
-        parse_options(argv)
+def read_spreadsheet(spreadsheet_input_file):
+    """
+    read the translated/reviewed spreadsheet
+    :param spreadsheet_input_file: csv file generated by
+    gen_translation_table.py and reviewed
+    :return: Survey with the original and translated codes
+    """
+    survey = Survey()
+    current_question = None
 
-    # read spreadsheet translated
     with open(spreadsheet_input_file, 'r') as f:
         reader = csv.reader(f)
-        spreadsheet_list = list(reader)
-    questions = {}
-    question_ids = {}
-    current_question = None
-
-    for index, line in enumerate(spreadsheet_list):
         # header in first line
-        if index > 0:
+        next(reader, None)
+        for line in reader:
             question_id = line[1]
-            question_type = line[2]
+            # e.g. 'L - List (Radio)'
+            question_type = line[2].split(' - ', 1)[0]
             item = line[3]
             # new question
             if item == 'question':
                 current_question_code = line[4]
                 translated_question_code = line[5]
-                current_question = current_question_code
-                if current_question in questions:
+                if current_question_code in survey.question_codes:
                     print('It\'s not supposed to have questions with same '
                           'code')
                 else:
-                    question_ids[question_id] = current_question
-                    questions[current_question] = {
-                        'translated_question_code': translated_question_code,
-                        'question_id': question_id,
-                        'question_type': question_type,
-                        'subquestions': {},
-                        'answers': {}}
+                    survey.add_question(
+                        question_id, None, current_question_code,
+                        type=question_type,
+                        translated_code=translated_question_code
+                    )
+                current_question = \
+                    survey.question_codes[current_question_code]
             elif item == "subquestion":
                 current_subquestion_code = line[6]
                 translated_subquestion_code = line[7]
                 if current_subquestion_code in \
-                        questions[current_question]['subquestions']:
+                        current_question.subquestion_codes:
                     print('It\'s not supposed to have subquestions with same '
                           'code')
                 else:
-                    questions[current_question]['subquestions'][current_subquestion_code] = \
-                        {
-                            'translated_subquestion_code': translated_subquestion_code,
-                            'subquestion_id': question_id
-                        }
+                    current_question.add_subquestion(Subquestion(
+                        question_id, current_question.qid,
+                        current_subquestion_code,
+                        translated_code=translated_subquestion_code
+                    ))
             elif item == "answer":
                 current_answer_code = line[8]
                 translated_answer_code = line[9]
-                if current_answer_code in \
-                        questions[current_question]['answers']:
+                if current_answer_code in current_question.answers:
                     print('It\'s not supposed to have answers with same code')
                 else:
-                    questions[current_question]['answers'][current_answer_code] = \
-                        {'translated_answer_code': translated_answer_code}
-
-    # spreadsheet validations
-
-    # open original lss and generates a copy to be translated
-    file_name = lss_input_file.split('.')
-    output_new_lss_file_name = file_name[0] + "_new." + file_name[1]
-    copyfile(lss_input_file, "temp_lss.lss")
-
-    tree = ETree.parse("temp_lss.lss")
-
-    for item in tree.iterfind('questions/rows/row'):
-        # fields to read: gid, qid, language, question_order, type, title
-        # (question_code), question (description, depends of the language)
-        question_code = item.findtext('title')
-        if question_code in questions:
-            item.find('title').text = \
-                questions[question_code]['translated_question_code']
-
-        # translate formulas and texts
-        if item.findtext('type') in ("*", "X"):
-            original_text = item.findtext('question')
-            for question in questions:
-                if question in original_text:
-                    item.find('question').text = \
-                        item.findtext('question').replace(
-                            question,
-                            questions[question]['translated_question_code']
-                        )
-
-        # Translation of relevance field (related to conditions)
-        # Examples of relevance:
-        #   (1) 1
-        #   (2) ((256242X320X16516.NAOK == "S"))
-        #   (3) ((256242X320X16517Outro.NAOK == "Y"))
-        #   (4) ((256242X319X16495.NAOK == "D" or 256242X319X16495.NAOK == "DE"))
-        #   (5) ((256242X322X17689Trofismo#1.NAOK == "P"))
-        #
-        #   *Example (1): não há nada para fazer
-        #   *Example (2): questão 16516 não contém subquestion, temos que
-        # traduzir somente a resposta
-        #   *Example (3): questão 16517 contém subquestion, temos que
-        # traduzir a subquestion e a resposta
-        #   *Example (4): podemos encontrar mais do que uma parte para traduzir
-        #   *Example (5): às vezes a subquestion vem com um sufixo '#'
-
-        relevance = item.findtext('relevance')
-        current_pos = 0
-        naok_pos = relevance.find('NAOK', current_pos)
-
-        while naok_pos != -1:
-            # traducao do subquestion
-            pieces = relevance[current_pos:naok_pos].split('X', maxsplit=2)
-            # ultima parte pode conter subquestion_code
-            question_id = pieces[-1][:5]
-            subquestion_code = pieces[-1][5:].split('.')[0].split('#')[0]
-            if question_id in question_ids:
-                question_code = question_ids[question_id]
-                if question_code in questions:
-                    if questions[question_code]['subquestions']:
-                        pieces[-1] = \
-                            pieces[-1].replace(
-                                subquestion_code,
-                                questions[question_code]['subquestions'][subquestion_code]['translated_subquestion_code']
-                            )
-                        relevance = relevance[:current_pos] + 'X'.join(pieces) + relevance[naok_pos:]
-                        item.find('relevance').text = relevance
-                        naok_pos = relevance.find('NAOK', current_pos)
-
-            # traducao do answer
-            if question_id in question_ids:
-                question_code = question_ids[question_id]
-                if question_code in questions:
-                    pieces = relevance[naok_pos + 9:].split('"')
-                    answer_code = pieces[0]
-                    if 'answers' in questions[question_code]:
-                        if answer_code in questions[question_code]['answers']:
-                            pieces[0] = \
-                                questions[question_code]['answers'][answer_code]['translated_answer_code']
-                            relevance = \
-                                relevance[:naok_pos + 9] + '"'.join(pieces)
-                            item.find('relevance').text = relevance
-                            naok_pos = relevance.find('NAOK', current_pos)
-                    else:
-                        print("question %s does not have answers")
-
-            # next 'NAOK'
-            current_pos = naok_pos + 1
-            naok_pos = relevance.find('NAOK', current_pos)
-
-    for item in tree.iterfind('subquestions/rows/row'):
-        # fields to read: gid, language, qid (subquestion id),
-        # parent_qid (question id), type (corresponde ao tipo da pergunta ou
-        # da subpergunta), title (subquestion_code), question (description,
-        # depends of the language), question_order
-        question_id = item.findtext('parent_qid')
-        if question_id in question_ids:
-            question_code = question_ids[question_id]
-            subquestion_code = item.findtext('title')
-            if subquestion_code in questions[question_code]['subquestions']:
-                item.find('title').text = \
-                    questions[question_code]['subquestions'][subquestion_code]['translated_subquestion_code']
-
-    for item in tree.iterfind('answers/rows/row'):
-        # fields to read: qid (question id), code (answer code)
-        question_id = item.findtext('qid')
-        if question_id in question_ids:
-            question_code = question_ids[question_id]
-            answer_code = item.findtext('code')
-            if answer_code in questions[question_code]['answers']:
-                item.find('code').text = \
-                    questions[question_code]['answers'][answer_code]['translated_answer_code']
-
-    for item in tree.iterfind('conditions/rows/row'):
-        question_id = item.findtext('cqid')
-        if question_id in question_ids:
-            question_code = question_ids[question_id]
-            # translate subquestion
-            if questions[question_code]['subquestions']:
-                field_name = item.findtext('cfieldname')
-                fields = field_name.split('X', maxsplit=2)
-                pieces = fields[-1].split('#')
-                subquestion_code = pieces[0].replace(
-                    questions[question_code]['question_id'], ''
+                    current_question.add_answer(Answer(
+                        current_question.qid, current_answer_code,
+                        translated_code=translated_answer_code
+                    ))
+
+    return survey
+
+
+def load_translations(spreadsheet_input_file='', translation_map_file=''):
+    """
+    :param spreadsheet_input_file: spreadsheet translated/reviewed
+    :param translation_map_file: translation map compiled from the
+    spreadsheet, used instead of it. The spreadsheet, if given, is only
+    checked to be the one the map was compiled from
+    :return: Survey with the original and translated codes
+    :raise StaleMapError: the map was compiled from another version of the
+    spreadsheet
+    """
+    if translation_map_file:
+        return read_translation_map(translation_map_file,
+                                    spreadsheet_input_file)
+    return read_spreadsheet(spreadsheet_input_file)
+
+
+def compile_translation_map(spreadsheet_input_file, translation_map_file):
+    """
+    save the codes of a reviewed spreadsheet in a translation map
+    :param spreadsheet_input_file: spreadsheet translated/reviewed
+    :param translation_map_file: translation map to be written
+    :return: Survey with the original and translated codes
+    """
+    with stats.stage('validation'):
+        validate_spreadsheet(spreadsheet_input_file)
+    survey = read_spreadsheet(spreadsheet_input_file)
+    with atomic_write(translation_map_file, 'w', encoding='UTF-8') as f:
+        write_translation_map(survey, f,
+                              file_sha256(spreadsheet_input_file),
+                              os.path.basename(spreadsheet_input_file))
+    return survey
+
+
+def translate_lss(lss_input_file, survey, streaming=False):
+    """
+    generate the lss file with the translated codes (<name>_new.lss)
+    :param lss_input_file: original questionnaire structure file
+    :param survey: Survey with the original and translated codes
+    :param streaming: translate the rows while the file is read, instead of
+    parsing the whole file first. Memory is bounded by the largest row
+    """
+    output_new_lss_file_name = new_file_name(lss_input_file)
+    lss_translator = LssTranslator(survey)
+
+    if streaming:
+        with stats.stage('lss_rewrite'):
+            with atomic_write(output_new_lss_file_name, 'wb') as new_lss_file:
+                rows, substitutions = rewrite_lss_stream(
+                    lss_input_file, new_lss_file,
+                    lss_translator.row_translators
                 )
-                if subquestion_code \
-                        in questions[question_code]['subquestions']:
-                    item.find('cfieldname').text = \
-                        'X'.join(fields[:-1] +
-                                 ['#'.join([questions[question_code]['question_id']
-                                            + questions[question_code]
-                                            ['subquestions'][subquestion_code]
-                                            ['translated_subquestion_code']]
-                                           + pieces[1:])])
-                else:
-                    print("Subquestion %s deveria existir" % subquestion_code)
-            # translate answer
-            answer_code = item.findtext('value')
-            if answer_code in questions[question_code]['answers']:
-                item.find('value').text = questions[question_code]['answers'][
-                    answer_code]['translated_answer_code']
+            stats.count('rows', rows)
+            stats.count('substitutions', substitutions)
+        return
+
+    # open original lss, translated in memory
+    with stats.stage('lss_parsing'):
+        tree = backend.parse(lss_input_file)
+
+    lss_translator.translate_tree(tree)
+
+    with stats.stage('lss_writing'):
+        with atomic_write(output_new_lss_file_name, 'wb') as new_lss_file:
+            backend.write(tree, new_lss_file)
+
+
+def translate_vv(answers_input_file, survey, chunk_size=DEFAULT_CHUNK_SIZE,
+                 jobs=1):
+    """
+    generate the vv file with the translated codes (<name>_new.<extension>)
+    :param answers_input_file: original vv data file
+    :param survey: Survey with the original and translated codes
+    :param chunk_size: number of responses translated at a time
+    :param jobs: number of processes translating the responses
+    """
+    # Open original csv data file and generate translated new one
+    output_new_csv_file_name = new_file_name(answers_input_file)
 
-    tree.write(
-        output_new_lss_file_name, xml_declaration=True, encoding="UTF-8"
-    )
+    # vv field name -> translated field name and question
+    field_index = FieldIndex(survey.question_codes)
 
-    # Open original csv data file and generate translated new one
-    file_name = answers_input_file.split('.')
-    output_new_csv_file_name = file_name[0] + "_new." + file_name[1]
-
-    original_data_file = open(answers_input_file, 'r').readlines()
-    translated_data_file = open(output_new_csv_file_name, 'w')
-
-    for index, row in enumerate(original_data_file):
-        if index == 0:
-            translated_data_file.writelines(row)  # TODO: improve?
-        if index == 1:
-            # TODO:
-            # multiple choice questions (type M) (not multiple questions
-            # with comments) is not captured here when there is a response
-            # with other option. The question code is not translated,
-            # and the imported responses will present error in this option.
-            # By now, correcting in the own new reponses csv generated.
-            for question in questions:
-                if not questions[question]['subquestions']:
-                    if question in row:
-                        row = row.replace(
-                            question,
-                            questions[question]['translated_question_code'])
-                else:
-                    for subquestion in questions[question]['subquestions']:
-                        if question + '_' + subquestion in row:
-                            # Needed to add '\t' for catching question + '_' +
-                            # subquestion exactly. Example:
-                            #   lisneurolisenervo_1 -> mulLysisNerve_DS
-                            #   lisneurolisenervo_10 -> mulLysisNerve_DS0
-                            row = row.replace(
-                                question + '_' + subquestion + '\t',
-                                questions[question]['translated_question_code']
-                                + '_' +
-                                questions[question]['subquestions'][
-                                    subquestion][
-                                    'translated_subquestion_code'] + '\t'
-                            )
-                            # replace array questions
-                            # (e.g. opcSensi_Cinestesia_0)
-                            row = row.replace(
-                                question + '_' + subquestion + '_',
-                                questions[question]['translated_question_code']
-                                + '_' +
-                                questions[question]['subquestions'][
-                                    subquestion][
-                                    'translated_subquestion_code'] + '_'
-                            )
-                            # replace questions with comments
-                            row = row.replace(
-                                question + '_' + subquestion + 'comment',
-                                questions[question]['translated_question_code']
-                                + '_' +
-                                questions[question]['subquestions'][subquestion][
-                                    'translated_subquestion_code'] + 'comment'
-                            )
-                # replace multiple questions with
-                # "<question>_other", e.g. "lisDorPr_other"
-                if question + '_other' in row:
-                    row = row.replace(
-                        question + '_other',
-                        questions[question]['translated_question_code']
-                        + '_other'
-                    )
-            translated_data_file.writelines(row)
+    with atomic_write(output_new_csv_file_name,
+                      newline='') as translated_data_file:
+        translate_vv_file(answers_input_file, translated_data_file,
+                          field_index, chunk_size, jobs)
 
     # Check if all questions codes (not subquestions or answers) was
     # translated in new vv file
     # TODO
 
-    # Translate answers in the new vv file
-    answers = pandas.read_table(answers_input_file, skiprows=1)
-    for column in answers:
-        question = [q for q in questions if q in column]
-        if not question:
-            continue
+
+def scan_residues(lss_input_file, answers_input_file, survey):
+    """
+    find original codes left in the translated files
+    :param lss_input_file: original questionnaire structure file, or empty
+    :param answers_input_file: original vv data file
+    :param survey: Survey with the original and translated codes
+    :return: list of Residue
+    """
+    scanner = ResidueScanner(survey)
+    residues = []
+    if lss_input_file:
+        residues += scanner.scan_lss(new_file_name(lss_input_file))
+    residues += scanner.scan_vv_header(new_file_name(answers_input_file))
+    return residues
+
+
+def translate(lss_input_file, answers_input_file, spreadsheet_input_file='',
+              chunk_size=DEFAULT_CHUNK_SIZE, translation_map_file='',
+              streaming=False, jobs=1):
+    """
+    generate the lss and vv files with the translated codes (<name>_new.lss
+    and <name>_new.<extension>)
+    :param lss_input_file: original questionnaire structure file. If empty,
+    only the vv file is translated
+    :param answers_input_file: original vv data file
+    :param spreadsheet_input_file: spreadsheet translated/reviewed
+    :param chunk_size: number of responses translated at a time
+    :param translation_map_file: translation map compiled from the
+    spreadsheet, used instead of it
+    :param streaming: translate the lss file while it is read (see
+    translate_lss)
+    :param jobs: number of processes translating the responses
+    :raise ValidationError: the spreadsheet has errors. Nothing is
+    translated
+    """
+    # spreadsheet validations, before any file is translated (a translation
+    # map was validated when compiled)
+    if spreadsheet_input_file and not translation_map_file:
+        with stats.stage('validation'):
+            validate_spreadsheet(spreadsheet_input_file)
+
+    with stats.stage('translations_reading'):
+        survey = load_translations(spreadsheet_input_file,
+                                   translation_map_file)
+        stats.count('questions', len(survey.question_codes))
+
+    translate_files(lss_input_file, answers_input_file, survey, chunk_size,
+                    streaming, jobs)
+
+
+def translate_files(lss_input_file, answers_input_file, survey,
+                    chunk_size=DEFAULT_CHUNK_SIZE, streaming=False, jobs=1):
+    """
+    generate the lss and vv files with the translated codes, from
+    translations already loaded (and validated)
+    :param lss_input_file: original questionnaire structure file, or empty
+    :param answers_input_file: original vv data file
+    :param survey: Survey with the original and translated codes
+    :param chunk_size: number of responses translated at a time
+    :param streaming: translate the lss file while it is read
+    :param jobs: number of processes translating the responses
+    :return: list of Residue (original codes left in the translated files)
+    """
+    if lss_input_file:
+        translate_lss(lss_input_file, survey, streaming)
+    translate_vv(answers_input_file, survey, chunk_size, jobs)
+
+    # end validations
+    with stats.stage('residue_scan'):
+        residues = scan_residues(lss_input_file, answers_input_file, survey)
+        stats.count('residues', len(residues))
+    for residue in residues:
+        print('Original code %s left in %s: %s' % (
+            residue.code, residue.location, residue.text[:80]
+        ))
+    return residues
+
+
+def main(argv):
+    lss_input_file, answers_input_file, spreadsheet_input_file, \
+        translation_map_file, compiled_map_file, chunk_size, jobs, \
+        stats_file, profile_file, streaming = parse_options(argv)
+    try:
+        if compiled_map_file:
+            run(lambda: compile_translation_map(spreadsheet_input_file,
+                                                compiled_map_file),
+                stats_file, profile_file)
         else:
-            question = question[0]
-            if not questions[question]['answers']:
-                continue
-            else:
-                for index, answer in enumerate(answers[column]):
-                    if answer in questions[question]['answers']:
-                        answers[column][index] = questions[question]['answers'][
-                            answer]['translated_answer_code']
-    answers.to_csv('temp_translated_data_file.csv', sep='\t', index=False,
-                   header=False)
-    temp_translated_data_file = open('temp_translated_data_file.csv', 'r')
-    for index, row in enumerate(temp_translated_data_file):
-        translated_data_file.writelines(row)
-    translated_data_file.close()
-
-    os.remove('temp_translated_data_file.csv')
-    os.remove('temp_lss.lss')
+            run(lambda: translate(lss_input_file, answers_input_file,
+                                  spreadsheet_input_file, chunk_size,
+                                  translation_map_file, streaming, jobs),
+                stats_file, profile_file)
+    except ValidationError as error:
+        print(error.errors.to_string(index=False))
+        print(error)
+        sys.exit(1)
+    except StaleMapError as error:
+        print(error)
+        sys.exit(1)
     print("Finished")
 
 
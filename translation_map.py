@@ -0,0 +1,147 @@
+"""
+Compiled translation map: the original and translated codes of a reviewed
+spreadsheet saved in a versioned json file, stamped with the SHA-256 of the
+spreadsheet it was compiled from and of its own content.
+
+Loading a map skips reading and checking the spreadsheet again, e.g. when
+only new vv exports of an already translated survey must be translated.
+When the spreadsheet is given, or is still next to the map, a map compiled
+from another version of it is refused.
+"""
+
+import hashlib
+import json
+import os
+
+from survey_model import Answer, Subquestion, Survey
+
+FORMAT = 'limesurvey-fields-translation-map'
+VERSION = 1
+
+
+class StaleMapError(ValueError):
+    """
+    the translation map was compiled from another version of the reviewed
+    spreadsheet
+    """
+
+
+def file_sha256(file_name):
+    """
+    :param file_name: file to be hashed
+    :return: hex SHA-256 of the file content
+    """
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _content_sha256(questions):
+    content = json.dumps(questions, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode('UTF-8')).hexdigest()
+
+
+def survey_to_map(survey):
+    """
+    :param survey: Survey with the original and translated codes
+    :return: list of questions, as json compatible values
+    """
+    return [
+        {
+            'qid': question.qid,
+            'type': question.type,
+            'code': question_code,
+            'translated_code': question.translated_code,
+            'subquestions': [
+                [subquestion.qid, subquestion.code,
+                 subquestion.translated_code]
+                for subquestion in question.subquestion_codes.values()
+            ],
+            'answers': [
+                [answer.code, answer.translated_code]
+                for answer in question.answers.values()
+            ]
+        }
+        for question_code, question in survey.question_codes.items()
+    ]
+
+
+def map_to_survey(questions):
+    """
+    :param questions: list of questions read from a translation map
+    :return: Survey with the original and translated codes
+    """
+    survey = Survey()
+    for item in questions:
+        question = survey.add_question(
+            item['qid'], None, item['code'], type=item['type'],
+            translated_code=item['translated_code']
+        )
+        for qid, code, translated_code in item['subquestions']:
+            question.add_subquestion(Subquestion(
+                qid, question.qid, code, translated_code=translated_code
+            ))
+        for code, translated_code in item['answers']:
+            question.add_answer(Answer(
+                question.qid, code, translated_code=translated_code
+            ))
+    return survey
+
+
+def write_translation_map(survey, output, source_sha256, source=''):
+    """
+    :param survey: Survey with the original and translated codes
+    :param output: file object (text) where the map is written
+    :param source_sha256: SHA-256 of the reviewed spreadsheet
+    :param source: file name of the reviewed spreadsheet (without the
+    directory)
+    """
+    questions = survey_to_map(survey)
+    json.dump({
+        'format': FORMAT,
+        'version': VERSION,
+        'source': source,
+        'source_sha256': source_sha256,
+        'content_sha256': _content_sha256(questions),
+        'questions': questions
+    }, output, ensure_ascii=False, separators=(',', ':'))
+
+
+def read_translation_map(translation_map_file, spreadsheet_input_file=''):
+    """
+    :param translation_map_file: file written by write_translation_map
+    :param spreadsheet_input_file: reviewed spreadsheet the map must have
+    been compiled from. If empty, the spreadsheet of the map is checked when
+    it is in the same directory
+    :return: Survey with the original and translated codes
+    :raise ValueError: unknown format or version, or corrupted content
+    :raise StaleMapError: the spreadsheet changed after the map was
+    compiled
+    """
+    with open(translation_map_file, 'r', encoding='UTF-8') as f:
+        content = json.load(f)
+
+    if content.get('format') != FORMAT or content.get('version') != VERSION:
+        raise ValueError(
+            '%s is not a translation map of version %d'
+            % (translation_map_file, VERSION)
+        )
+    if _content_sha256(content['questions']) != content['content_sha256']:
+        raise ValueError('%s is corrupted' % translation_map_file)
+
+    if not spreadsheet_input_file and content.get('source'):
+        spreadsheet_input_file = os.path.join(
+            os.path.dirname(translation_map_file), content['source']
+        )
+        if not os.path.isfile(spreadsheet_input_file):
+            spreadsheet_input_file = ''
+    if spreadsheet_input_file and \
+            file_sha256(spreadsheet_input_file) != content['source_sha256']:
+        raise StaleMapError(
+            '%s was not compiled from the current %s: compile it again (-c)'
+            % (translation_map_file, spreadsheet_input_file)
+        )
+
+    return map_to_survey(content['questions'])
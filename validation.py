@@ -0,0 +1,176 @@
+"""
+Validation of the reviewed spreadsheet, before any file is translated.
+
+The spreadsheet is loaded by columns and every rule is checked over whole
+columns at once:
+- untranslated codes (empty translated code)
+- codes with whitespace or special characters (only letters and digits;
+  question codes begin with a letter)
+- codes longer than the limits: question 20, subquestion 20, answer 5
+- duplicated codes: questions in the survey, subquestions and answers in
+  their question (original or translated codes)
+- unknown items
+"""
+
+import csv
+
+import numpy
+import pandas
+
+from file_utils import atomic_write, new_file_name
+
+COLUMNS = ['group', 'question_id', 'question_type', 'item',
+           'question_code', 'translated_question_code',
+           'subquestion_code', 'translated_subquestion_code',
+           'answer_code', 'translated_answer_code',
+           'description_pt', 'description_en']
+
+ITEMS = ('question', 'subquestion', 'answer')
+
+# maximum size of the codes
+CODE_SIZES = {'question': 20, 'subquestion': 20, 'answer': 5}
+
+VALID_CODE = r'[A-Za-z0-9]+\Z'
+VALID_QUESTION_CODE = r'[A-Za-z][A-Za-z0-9]*\Z'
+
+REPORT_COLUMNS = ['line', 'item', 'code', 'translated code', 'error']
+
+
+class ValidationError(ValueError):
+    """
+    the spreadsheet has errors, listed in errors (DataFrame with the
+    REPORT_COLUMNS)
+    """
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def record_lines(spreadsheet_input_file):
+    """
+    :param spreadsheet_input_file: reviewed spreadsheet
+    :return: line of the file where each record (after the header) begins.
+    Descriptions may have many lines (texts of the questions in html)
+    """
+    lines = []
+    with open(spreadsheet_input_file, 'r', newline='',
+              encoding='UTF-8') as f:
+        reader = csv.reader(f)
+        while True:
+            line = reader.line_num + 1
+            row = next(reader, None)
+            if row is None:
+                break
+            # blank lines are skipped, as pandas does
+            if row:
+                lines.append(line)
+    return lines[1:]
+
+
+def read_spreadsheet_columns(spreadsheet_input_file):
+    """
+    :param spreadsheet_input_file: reviewed spreadsheet
+    :return: DataFrame with the COLUMNS, all of them as text (empty cells
+    are empty strings) and the codes of each item in the columns code and
+    translated, the question id of each row in parent, and the line of the
+    file where each row begins in line
+    """
+    spreadsheet = pandas.read_csv(
+        spreadsheet_input_file, header=0, names=COLUMNS, dtype=str,
+        keep_default_na=False
+    )
+    spreadsheet['line'] = record_lines(spreadsheet_input_file)
+    item = spreadsheet['item']
+    is_question = item == 'question'
+    is_subquestion = item == 'subquestion'
+
+    spreadsheet['code'] = numpy.select(
+        [is_question, is_subquestion],
+        [spreadsheet['question_code'], spreadsheet['subquestion_code']],
+        spreadsheet['answer_code']
+    )
+    spreadsheet['translated'] = numpy.select(
+        [is_question, is_subquestion],
+        [spreadsheet['translated_question_code'],
+         spreadsheet['translated_subquestion_code']],
+        spreadsheet['translated_answer_code']
+    )
+    # subquestion rows have their own ids: the question is the last one
+    # above
+    spreadsheet['parent'] = spreadsheet['question_id'].where(is_question) \
+        .ffill().fillna('')
+    return spreadsheet
+
+
+def find_errors(spreadsheet):
+    """
+    :param spreadsheet: DataFrame read by read_spreadsheet_columns
+    :return: DataFrame with the REPORT_COLUMNS, one row for each error,
+    ordered by line
+    """
+    item = spreadsheet['item']
+    translated = spreadsheet['translated']
+    is_question = item == 'question'
+    known = item.isin(ITEMS)
+    # questions are unique in the survey, the other items in their question
+    scope = spreadsheet['parent'].where(~is_question, '')
+    translated_filled = known & (translated != '')
+
+    rules = [
+        (~known, 'unknown item'),
+        (known & (translated == ''), 'untranslated code'),
+        (translated_filled & ~is_question &
+         ~translated.str.match(VALID_CODE),
+         'whitespace or special characters in the code'),
+        (translated_filled & is_question &
+         ~translated.str.match(VALID_QUESTION_CODE),
+         'whitespace or special characters in the code, or it does not '
+         'begin with a letter'),
+        (translated.str.len() > item.map(CODE_SIZES).fillna(numpy.inf),
+         'code longer than the limit'),
+        (known & spreadsheet.assign(scope=scope).duplicated(
+            ['item', 'scope', 'code'], keep=False),
+         'duplicated code'),
+        (translated_filled & spreadsheet.assign(scope=scope).duplicated(
+            ['item', 'scope', 'translated'], keep=False),
+         'duplicated translated code'),
+    ]
+
+    errors = [
+        pandas.DataFrame({
+            'line': spreadsheet['line'][mask],
+            'item': item[mask],
+            'code': spreadsheet['code'][mask],
+            'translated code': translated[mask],
+            'error': message
+        }, columns=REPORT_COLUMNS)
+        for mask, message in rules if mask.any()
+    ]
+    if not errors:
+        return pandas.DataFrame(columns=REPORT_COLUMNS)
+    return pandas.concat(errors).sort_values('line', kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def validate_spreadsheet(spreadsheet_input_file):
+    """
+    check the reviewed spreadsheet. When there are errors, all of them are
+    written in <spreadsheet>_errors.csv
+    :param spreadsheet_input_file: reviewed spreadsheet
+    :raise ValidationError: the spreadsheet has errors
+    """
+    errors = find_errors(read_spreadsheet_columns(spreadsheet_input_file))
+    if errors.empty:
+        return
+
+    report_file_name = new_file_name(spreadsheet_input_file, '_errors')
+    with atomic_write(report_file_name, 'w', newline='',
+                      encoding='UTF-8') as report_file:
+        errors.to_csv(report_file, index=False)
+    raise ValidationError(
+        '%d errors in %s, listed in %s' % (len(errors),
+                                           spreadsheet_input_file,
+                                           report_file_name),
+        errors
+    )
@@ -0,0 +1,305 @@
+"""
+Translation of the LimeSurvey vv (response) files: header with the field
+names and answer codes of the responses.
+
+The responses are read as text, with NA filtering and quoting turned off,
+so every value the translation does not change is written back byte for
+byte ('NA', 'null', '01', quotes...).
+"""
+
+import collections
+import concurrent.futures
+import csv
+import io
+import itertools
+
+import pandas
+
+from instrumentation import stats
+
+# number of responses read, translated and written at a time
+DEFAULT_CHUNK_SIZE = 10000
+
+
+# question types whose subquestions are in two scales, and that have a
+# field for each pair of subquestions: <question>_<scale 0>_<scale 1>
+ARRAY_TEXT_TYPES = (';', ':')
+
+
+class FieldIndex:
+    """
+    Index of the vv field names: field name -> (translated field name,
+    question whose answer codes the field holds, or None for free text
+    fields).
+
+    Names are generated for every question, question_subquestion,
+    question_other, comment, dual scale (#0/#1) and array (_<sub>_<sub>)
+    field. Any other name beginning with '<question>_<subquestion>_' is
+    resolved the first time it is seen.
+    """
+
+    def __init__(self, questions):
+        """
+        :param questions: dict question code -> Question
+        """
+        self.questions = questions
+        self.fields = {}
+        for question_code, question in questions.items():
+            self._add_question(question_code, question)
+
+    def _add(self, field_name, translated_field_name, question=None):
+        self.fields.setdefault(field_name, (translated_field_name, question))
+
+    def _add_question(self, question_code, question):
+        translated_code = question.translated_code
+        answers = question if question.answers else None
+
+        self._add(question_code, translated_code, answers)
+        for suffix in ('_other', '_othercomment', 'comment'):
+            self._add(question_code + suffix, translated_code + suffix)
+
+        subquestions = question.subquestion_codes
+        for subquestion_code, subquestion in subquestions.items():
+            field_name = question_code + '_' + subquestion_code
+            translated_field_name = \
+                translated_code + '_' + subquestion.translated_code
+            self._add(field_name, translated_field_name, answers)
+            self._add(field_name + 'comment', translated_field_name + 'comment')
+            for scale in ('#0', '#1'):
+                self._add(field_name + scale, translated_field_name + scale,
+                          answers)
+            if question.type in ARRAY_TEXT_TYPES:
+                for other_code, other in subquestions.items():
+                    self._add(field_name + '_' + other_code,
+                              translated_field_name + '_' +
+                              other.translated_code)
+
+    def _resolve(self, field_name):
+        # '<question>_<subquestion>_<anything>', e.g. an array scale suffix
+        pieces = field_name.split('_', 2)
+        if len(pieces) == 3:
+            question = self.questions.get(pieces[0])
+            if question is not None:
+                subquestion = question.subquestion_codes.get(pieces[1])
+                if subquestion is not None:
+                    return (question.translated_code + '_' +
+                            subquestion.translated_code + '_' + pieces[2],
+                            None)
+        return field_name, None
+
+    def lookup(self, field_name):
+        """
+        :param field_name: field name of the vv file
+        :return: (translated field name, question or None)
+        """
+        entry = self.fields.get(field_name)
+        if entry is None:
+            entry = self.fields[field_name] = self._resolve(field_name)
+        return entry
+
+    def translate_header(self, header):
+        """
+        :param header: line of the vv file with the field names
+        :return: line with the translated field names
+        """
+        content = header.rstrip('\r\n')
+        line_end = header[len(content):]
+        return '\t'.join(
+            self.lookup(field_name)[0] for field_name in content.split('\t')
+        ) + line_end
+
+    def answer_translations(self, columns):
+        """
+        translations of the answer codes for each column of the vv file
+        :param columns: field names of the vv file
+        :return: dict column -> dict original answer code -> translated code.
+        Columns without answers to translate are left out
+        """
+        translations = {}
+        for column in columns:
+            question = self.lookup(column)[1]
+            if question is not None:
+                translations[column] = {
+                    answer_code: answer.translated_code
+                    for answer_code, answer in question.answers.items()
+                }
+        return translations
+
+
+def translate_answer_columns(answers, translations):
+    """
+    translate the answer codes of the responses, a whole column at a time
+    :param answers: DataFrame with the responses
+    :param translations: dict column -> dict original answer code ->
+    translated code
+    :return: number of columns translated
+    """
+    translated_columns = 0
+    for column, column_translations in translations.items():
+        series = answers[column]
+        # columns without any of the codes are not touched
+        if column_translations.keys().isdisjoint(series.unique()):
+            continue
+        answers[column] = series.where(
+            ~series.isin(column_translations.keys()),
+            series.map(column_translations)
+        )
+        translated_columns += 1
+    return translated_columns
+
+
+def read_responses(input_file, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    read the responses of a vv file exactly as they are written: every
+    column as text, with NA filtering and quoting turned off
+    :param input_file: file object positioned at the first response
+    :param columns: field names
+    :param chunk_size: number of responses read at a time, or None to read
+    all of them at once
+    :return: iterator of DataFrames, or a DataFrame
+    """
+    return pandas.read_csv(
+        input_file, sep='\t', header=None, names=columns, dtype=str,
+        na_filter=False, keep_default_na=False, quoting=csv.QUOTE_NONE,
+        chunksize=chunk_size
+    )
+
+
+def write_responses(responses, output, line_end='\n'):
+    """
+    write responses as they were read by read_responses. Every value is
+    text and no field has a tab or a line end, so the lines are joined as
+    they are (faster than DataFrame.to_csv of text columns)
+    :param responses: DataFrame
+    :param output: text file object
+    :param line_end: line end of the original file
+    """
+    output.writelines(
+        '\t'.join(row) + line_end
+        for row in responses.itertuples(index=False, name=None)
+    )
+
+
+def read_blocks(input_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    read the responses of a vv file as text, without parsing them. Fields
+    are not quoted, so each line is a response
+    :param input_file: file object positioned at the first response
+    :param chunk_size: number of lines of each block
+    :return: iterator of blocks of lines (str)
+    """
+    while True:
+        lines = list(itertools.islice(input_file, chunk_size))
+        if not lines:
+            return
+        yield ''.join(lines)
+
+
+# columns, translations and line end of the vv file being translated, in
+# each process of the pool (see translate_vv_file)
+_block_context = None
+
+
+def _start_block_process(*context):
+    global _block_context
+    _block_context = context
+
+
+def _translate_block(block):
+    # runs in a process of the pool
+    columns, translations, line_end = _block_context
+    responses = read_responses(io.StringIO(block), columns, None)
+    translated_columns = translate_answer_columns(responses, translations)
+    output = io.StringIO()
+    write_responses(responses, output, line_end)
+    return output.getvalue(), len(responses), translated_columns
+
+
+def translate_vv_file(answers_input_file, output, field_index,
+                      chunk_size=DEFAULT_CHUNK_SIZE, jobs=1):
+    """
+    translate a vv file, streaming the responses in chunks of rows straight
+    to the output, so memory does not grow with the number of responses
+    :param answers_input_file: original vv file
+    :param output: file object where the translated vv file is written,
+    opened with newline='' (line ends are written as in the original)
+    :param field_index: FieldIndex of the survey
+    :param chunk_size: number of responses translated at a time
+    :param jobs: number of processes translating chunks at the same time.
+    The chunks are written in their original order, so the output is the
+    same for any number of processes
+    :return: number of responses translated
+    """
+    responses = 0
+    with open(answers_input_file, 'r', newline='') as input_file:
+        # first line: question texts
+        output.write(input_file.readline())
+        # second line: field names
+        with stats.stage('vv_header'):
+            header = input_file.readline()
+            translated_header = field_index.translate_header(header)
+            output.write(translated_header)
+
+            columns = header.rstrip('\r\n').split('\t')
+            translations = field_index.answer_translations(columns)
+            stats.count('fields', len(columns))
+            stats.count('substitutions', sum(
+                field_name != translated_field_name
+                for field_name, translated_field_name in
+                zip(columns, translated_header.rstrip('\r\n').split('\t'))
+            ))
+
+        line_end = header[len(header.rstrip('\r\n')):] or '\n'
+        if jobs > 1:
+            return _translate_vv_blocks(
+                input_file, output, chunk_size, jobs,
+                (columns, translations, line_end)
+            )
+
+        chunks = read_responses(input_file, columns, chunk_size)
+        while True:
+            with stats.stage('vv_reading'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with stats.stage('vv_answers'):
+                stats.count('rows', len(chunk))
+                stats.count('columns_translated',
+                            translate_answer_columns(chunk, translations))
+            with stats.stage('vv_writing'):
+                write_responses(chunk, output, line_end)
+            responses += len(chunk)
+    return responses
+
+
+def _translate_vv_blocks(input_file, output, chunk_size, jobs, context):
+    # blocks of responses translated by a pool of processes; at most two
+    # blocks per process are read ahead of the block being written
+    responses = 0
+    pending = collections.deque()
+
+    def write_next():
+        nonlocal responses
+        with stats.stage('vv_answers'):
+            content, rows, translated_columns = pending.popleft().result()
+            stats.count('rows', rows)
+            stats.count('columns_translated', translated_columns)
+        with stats.stage('vv_writing'):
+            output.write(content)
+        responses += rows
+
+    with concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=_start_block_process,
+            initargs=context) as executor:
+        blocks = read_blocks(input_file, chunk_size)
+        while True:
+            with stats.stage('vv_reading'):
+                block = next(blocks, None)
+            if block is None:
+                break
+            pending.append(executor.submit(_translate_block, block))
+            if len(pending) > 2 * jobs:
+                write_next()
+        while pending:
+            write_next()
+    return responses
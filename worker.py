@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+
+"""
+Long-running worker: runs translation jobs read from stdin, or from a local
+(unix) socket, in the same process, so pandas, the stopwords and the
+translations of the surveys already seen stay loaded between jobs.
+
+Each job is a json object in one line, and each one gets a json response
+in one line:
+
+    {"id": 1, "action": "generate", "lss": "limesurvey_survey_1.lss",
+     "output": "spreadsheet_to_review_1.csv", "previous": ""}
+    {"id": 2, "action": "compile", "reviewed": "spreadsheet_reviewed_1.csv",
+     "map": "translation_map_1.json"}
+    {"id": 3, "action": "translate", "lss": "limesurvey_survey_1.lss",
+     "vv": "vvexport_1.csv", "reviewed": "spreadsheet_reviewed_1.csv",
+     "map": "", "chunk_size": 10000, "streaming": false,
+     "jobs": 1}
+    {"action": "shutdown"}
+
+    {"id": 3, "status": "ok", "seconds": 0.41, "output": "...",
+     "residues": 0}
+    {"id": 4, "status": "error", "seconds": 0.01, "output": "...",
+     "error": "Traceback ..."}
+
+"output" has what the job printed. The translations of a reviewed
+spreadsheet or translation map are loaded (and validated) once, and loaded
+again only when the file changes.
+"""
+
+import contextlib
+import getopt
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import api
+from vv_translation import DEFAULT_CHUNK_SIZE
+
+USAGE = 'worker.py [-s <socket file>]'
+
+# translations kept loaded
+MAX_CACHED_TRANSLATIONS = 32
+
+SHUTDOWN = 'shutdown'
+
+
+def file_stamp(file_name):
+    """
+    :return: (modification time, size) of a file, or None for no file
+    """
+    if not file_name:
+        return None
+    status = os.stat(file_name)
+    return status.st_mtime_ns, status.st_size
+
+
+class Worker:
+    """
+    Runs jobs, keeping the translations loaded between them
+    """
+
+    def __init__(self, max_cached_translations=MAX_CACHED_TRANSLATIONS):
+        # (spreadsheet, translation map) -> (stamps, Survey), least
+        # recently used first
+        self.translations = OrderedDict()
+        self.max_cached_translations = max_cached_translations
+        self.actions = {
+            'generate': self.generate,
+            'compile': self.compile,
+            'translate': self.translate
+        }
+        api.warm_up()
+
+    def load_translations(self, spreadsheet_input_file, translation_map_file):
+        key = (spreadsheet_input_file, translation_map_file)
+        stamps = (file_stamp(spreadsheet_input_file),
+                  file_stamp(translation_map_file))
+        cached = self.translations.get(key)
+        if cached is not None and cached[0] == stamps:
+            self.translations.move_to_end(key)
+            return cached[1]
+
+        survey = api.load_translations(spreadsheet_input_file,
+                                       translation_map_file)
+        self.translations[key] = (stamps, survey)
+        self.translations.move_to_end(key)
+        while len(self.translations) > self.max_cached_translations:
+            self.translations.popitem(last=False)
+        return survey
+
+    def generate(self, job):
+        api.generate_table(job['lss'], job['output'],
+                           job.get('previous', ''))
+        return {}
+
+    def compile(self, job):
+        api.compile_translation_map(job['reviewed'], job['map'])
+        return {}
+
+    def translate(self, job):
+        translation_map_file = job.get('map', '')
+        survey = self.load_translations(job.get('reviewed', ''),
+                                        translation_map_file)
+        residues = api.translate_files(
+            job.get('lss', ''), job['vv'], survey,
+            job.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            job.get('streaming', False), job.get('jobs', 1)
+        )
+        return {'residues': len(residues)}
+
+    def run(self, job):
+        """
+        :param job: dict with the action and its files
+        :return: response (dict)
+        """
+        response = {'id': job.get('id')}
+        output = io.StringIO()
+        start = time.perf_counter()
+        try:
+            action = self.actions.get(job.get('action'))
+            if action is None:
+                raise ValueError('unknown action: %s' % job.get('action'))
+            with contextlib.redirect_stdout(output):
+                response.update(action(job))
+            response['status'] = 'ok'
+        except Exception:
+            response['status'] = 'error'
+            response['error'] = traceback.format_exc(limit=3)
+        response['seconds'] = time.perf_counter() - start
+        response['output'] = output.getvalue()
+        return response
+
+    def run_line(self, line):
+        """
+        :param line: job in json
+        :return: response in json (one line), or None to shut down
+        """
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError('a job must be a json object')
+        except ValueError as error:
+            return json.dumps({'id': None, 'status': 'error',
+                               'error': 'invalid job: %s' % error}) + '\n'
+        if job.get('action') == SHUTDOWN:
+            return None
+        return json.dumps(self.run(job)) + '\n'
+
+
+def serve_stream(worker, input_file, output_file):
+    """
+    run the jobs of the lines of input_file until it ends or a shutdown job
+    """
+    for line in input_file:
+        if not line.strip():
+            continue
+        response = worker.run_line(line)
+        if response is None:
+            break
+        output_file.write(response)
+        output_file.flush()
+
+
+def serve_socket(worker, socket_file_name):
+    """
+    run the jobs sent to a unix socket, one connection and one job at a
+    time, until a shutdown job
+    """
+    if os.path.exists(socket_file_name) and \
+            stat.S_ISSOCK(os.stat(socket_file_name).st_mode):
+        os.remove(socket_file_name)
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.decode('UTF-8')
+                if not line.strip():
+                    continue
+                response = worker.run_line(line)
+                if response is None:
+                    # shutdown() waits for serve_forever(), which runs this
+                    threading.Thread(target=self.server.shutdown).start()
+                    break
+                self.wfile.write(response.encode('UTF-8'))
+                self.wfile.flush()
+
+    with socketserver.UnixStreamServer(socket_file_name, JobHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_file_name)
+
+
+def parse_options(argv):
+    socket_file_name = ''
+    try:
+        opts, args = getopt.getopt(argv, 'hs:', ['socket='])
+    except getopt.GetoptError:
+        print(USAGE)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit(1)
+        elif opt in ('-s', '--socket'):
+            socket_file_name = arg
+    return [socket_file_name]
+
+
+def main(argv):
+    socket_file_name, = parse_options(argv)
+    worker = Worker()
+    if socket_file_name:
+        serve_socket(worker, socket_file_name)
+    else:
+        serve_stream(worker, sys.stdin, sys.stdout)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])